@@ -0,0 +1,325 @@
+"""Synthetic data generator and benchmark suite for the data layer. Runs without tkinter.
+
+    python benchmark.py generate big.db --rows 1M
+    python benchmark.py run --rows 10k 1M --out results.json
+    python benchmark.py run --rows 10k --compare results.json
+
+`generate` writes a reproducible database: the same --rows, --users, --years
+and --seed always produce the same data. `run` generates (or reuses, from
+--data-dir) one database per size, times the queries behind the app's main
+views and prints a JSON report with p50/p99 latency and peak Python memory
+per case, for comparing runs over time.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import database
+
+# category -> (share of expenses, median amount, spread of the log-normal amount)
+CATEGORIES = {
+    'Food': (0.45, 12.0, 0.6),
+    'Transport': (0.25, 8.0, 0.7),
+    'Entertainment': (0.15, 25.0, 0.8),
+    'Other': (0.15, 40.0, 1.0),
+}
+PAYMENT_METHODS = {'Card': 0.55, 'Cash': 0.25, 'Online': 0.20}
+NOTES = {
+    'Food': ['groceries', 'lunch', 'coffee', 'dinner out', 'bakery', 'takeaway'],
+    'Transport': ['bus ticket', 'train', 'taxi', 'fuel', 'parking', 'bike repair'],
+    'Entertainment': ['cinema', 'concert', 'streaming', 'books', 'museum', 'games'],
+    'Other': ['pharmacy', 'gift', 'haircut', 'phone bill', 'clothes', 'household'],
+}
+LOCATIONS = ['London', 'Manchester', 'Leeds', 'Bristol', 'Glasgow', 'Cardiff', 'Belfast', 'Online', '']
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Emma', 'Farid', 'Grace', 'Hiro', 'Isla', 'Jonas',
+               'Keira', 'Liam', 'Maya', 'Noah', 'Olga', 'Priya', 'Quinn', 'Rosa', 'Sam', 'Tariq',
+               'Uma', 'Victor', 'Wen', 'Ximena', 'Yusuf', 'Zoe']
+END_DATE = date(2024, 12, 31)   # fixed, so the data does not depend on the day it is generated
+
+SIZES = (10_000, 1_000_000, 10_000_000)
+DATA_DIR = 'bench_data'
+REPEAT = 20
+EXPORT_REPEAT = 3   # a full export is slow at the larger sizes
+
+
+def _count(text):
+    """Parse a row count such as 5000, 10k or 1M."""
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:].lower(), 1)
+    try:
+        value = int(float(text[:-1] if scale > 1 else text) * scale)
+    except ValueError:
+        value = 0
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f'invalid row count: {text}')
+    return value
+
+
+def default_users(rows):
+    return max(10, min(rows // 2000, 5000))
+
+
+# --------------------- Generator ---------------------
+def generate(path, rows, users=None, years=3, seed=42):
+    """Write a new database at `path` with `rows` expenses for `users` users.
+
+    User activity is skewed (a few users own most of the expenses), categories,
+    payment methods and amounts follow fixed weights and log-normal amounts,
+    and weekends and December see more spending. About 70% of users get a
+    monthly budget near their average monthly spend.
+
+    Rows are inserted in date order into the bare base schema and migrate()
+    then builds the indexes, monthly totals and search index in one pass
+    each, which is far faster than paying the triggers per row.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f'{path} already exists')
+    users = users or default_users(rows)
+    rng = random.Random(seed)
+    names = [FIRST_NAMES[i % len(FIRST_NAMES)] + (f' {i // len(FIRST_NAMES)}' if i >= len(FIRST_NAMES) else '')
+             for i in range(users)]
+    user_weights = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(users)))
+    categories = list(CATEGORIES)
+    category_weights = list(itertools.accumulate(share for share, _, _ in CATEGORIES.values()))
+    payments = list(PAYMENT_METHODS)
+    payment_weights = list(itertools.accumulate(PAYMENT_METHODS.values()))
+
+    first = END_DATE.replace(year=END_DATE.year - years) + timedelta(days=1)
+    days = [first + timedelta(days=i) for i in range((END_DATE - first).days + 1)]
+    day_weights = list(itertools.accumulate((1.3 if d.weekday() >= 5 else 1.0) * (1.2 if d.month == 12 else 1.0)
+                                            for d in days))
+
+    database.DB_FILE = path
+    try:
+        database.create_db(upgrade=False)
+        conn = database.get_connection()
+        sql = 'INSERT INTO expenses (name, amount, category, date, notes, payment_method, location) VALUES (?,?,?,?,?,?,?)'
+        done = 0
+        for day, cumulative in zip(days, day_weights):
+            n = round(rows * cumulative / day_weights[-1]) - done
+            batch = []
+            for name, category, payment in zip(rng.choices(names, cum_weights=user_weights, k=n),
+                                               rng.choices(categories, cum_weights=category_weights, k=n),
+                                               rng.choices(payments, cum_weights=payment_weights, k=n)):
+                _, median, sigma = CATEGORIES[category]
+                batch.append((name, round(median * rng.lognormvariate(0, sigma), 2), category, day.isoformat(),
+                              rng.choice(NOTES[category]), payment, rng.choice(LOCATIONS)))
+            with conn:
+                conn.executemany(sql, batch)
+            done += n
+
+        months = years * 12
+        spent = conn.execute('SELECT name, SUM(amount) FROM expenses GROUP BY name ORDER BY name').fetchall()
+        budgets = [(name, round(total / months * rng.uniform(0.8, 1.3), -1))
+                   for name, total in spent if rng.random() < 0.7]
+        with conn:
+            conn.executemany('INSERT INTO budgets (name, monthly_budget) VALUES (?, ?)', budgets)
+        database.migrate()
+    finally:
+        database.close_connections()
+    return path
+
+
+# --------------------- Benchmarks ---------------------
+def _percentile(sorted_values, pct):
+    # nearest-rank percentile
+    index = max(0, -(-len(sorted_values) * pct // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def _write_csv_to_null():
+    with open(os.devnull, 'w', newline='', encoding='utf-8') as sink:
+        return database.write_expenses_csv(sink, compress=False)
+
+
+def _cases():
+    """Return (name, fn, repeat, prepare) for each benchmark, using the queries the app runs.
+
+    The filters use the most active user, the last month and the last 90 days
+    of data, since that is what a user of a large history looks at most.
+    prepare (or None) runs untimed before each call, for state the app
+    already has cached at that point.
+    """
+    conn = database.get_connection()
+    user = conn.execute('SELECT name FROM monthly_totals GROUP BY name ORDER BY SUM(count) DESC LIMIT 1').fetchone()[0]
+    month = conn.execute('SELECT MAX(month) FROM monthly_totals').fetchone()[0]
+    last = conn.execute('SELECT MAX(date) FROM expenses').fetchone()[0]
+    first = (date.fromisoformat(last) - timedelta(days=89)).isoformat()
+    total = conn.execute('SELECT COUNT(*) FROM expenses').fetchone()[0]
+    middle = conn.execute('SELECT date, id FROM expenses ORDER BY date, id LIMIT 1 OFFSET ?', (total // 2,)).fetchone()
+
+    filters = {
+        'all': ('', '', '', '', '', ''),
+        'user': (user, '', '', '', '', ''),
+        'category_90d': ('', 'Food', '', first, last, ''),
+        'user_payment_90d': (user, '', 'Card', first, last, ''),
+        'search': ('', '', '', '', '', 'coffee'),
+        'search_location': ('', '', '', '', '', 'glasgow'),
+        'search_name': ('', '', '', '', '', user.split()[0]),
+        'search_two_words': ('', '', '', '', '', 'museum glasgow'),
+        'search_user': (user, '', '', '', '', 'coff'),
+    }
+    cases = []
+    for label, f in filters.items():
+        # apply_filters: the count and the first page, as ExpenseTrackerApp._fetch_first_page
+        cases.append((f'apply_filters/{label}',
+                      lambda f=f: (database.count_expenses(*f), database.query_expenses_page(*f, limit=200)), REPEAT, None))
+    for label, f in filters.items():
+        if label.startswith('search'):
+            # just the page: by the time the app asks for it, the count is cached
+            cases.append((f'search_page/{label}', lambda f=f: database.query_expenses_page(*f, limit=200), REPEAT,
+                          lambda f=f: database.count_expenses(*f)))
+    cases += [
+        ('apply_filters/scroll_middle', lambda: database.query_expenses_page(after=middle, limit=200), REPEAT, None),
+        ('search_page/scroll_middle', lambda: database.query_expenses_page(*filters['search'], after=middle, limit=200), REPEAT,
+         lambda: database.count_expenses(*filters['search'])),
+        ('check_budget_alert', lambda: database.budget_status(user, month), REPEAT, None),
+        ('load_user_list', lambda: database.user_summaries(month), REPEAT, None),
+        ('chart/by_category', lambda: database.grouped_totals('category', *filters['all']), REPEAT, None),
+        ('chart/by_category_90d', lambda: database.grouped_totals('category', *filters['category_90d']), REPEAT, None),
+        ('chart/by_category_payment', lambda: database.grouped_totals('category', '', '', 'Card', '', '', ''), REPEAT, None),
+        ('chart/over_time', lambda: database.grouped_totals('month', *filters['user']), REPEAT, None),
+        ('chart/per_user', lambda: database.grouped_totals('name', *filters['all']), REPEAT, None),
+        ('chart/budget_vs_actual', lambda: database.budget_overview(month), REPEAT, None),
+        ('export_csv', _write_csv_to_null, EXPORT_REPEAT, None),
+    ]
+    return cases
+
+
+def measure(fn, repeat, prepare=None):
+    """Time `repeat` cold-cache calls of fn; return latency stats (ms) and peak Python memory (KiB).
+
+    A first, untimed call runs under tracemalloc to record peak memory (and
+    warms SQLite's page cache, as in the long-running app). The query result
+    cache is emptied before every call, so each one does the real work;
+    prepare() then runs, untimed, just before it.
+    """
+    database.clear_query_cache()
+    if prepare:
+        prepare()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        database.clear_query_cache()
+        if prepare:
+            prepare()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {'runs': repeat, 'p50_ms': round(_percentile(times, 50), 3), 'p99_ms': round(_percentile(times, 99), 3),
+            'min_ms': round(times[0], 3), 'max_ms': round(times[-1], 3), 'peak_kib': round(peak / 1024, 1)}
+
+
+def run(sizes, data_dir=DATA_DIR, users=None, years=3, seed=42, only=None, progress=None):
+    """Benchmark each size in `sizes`; return the report as a dict."""
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    for rows in sizes:
+        n_users = users or default_users(rows)
+        path = os.path.join(data_dir, f'expenses-{rows}-u{n_users}-y{years}-s{seed}.db')
+        if not os.path.exists(path):
+            if progress:
+                progress(f'generating {path}')
+            start = time.perf_counter()
+            generate(path, rows, n_users, years, seed)
+            if progress:
+                progress(f'generated {rows} rows in {time.perf_counter() - start:.1f} s')
+        database.DB_FILE = path
+        try:
+            database.create_db()
+            for name, fn, repeat, prepare in _cases():
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                stats = measure(fn, repeat, prepare)
+                results.append({'rows': rows, 'users': n_users, 'case': name, **stats})
+                if progress:
+                    progress(f"{rows:>10} {name:<30} p50 {stats['p50_ms']:10.2f} ms  p99 {stats['p99_ms']:10.2f} ms")
+        finally:
+            database.close_connections()
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': seed,
+            'years': years,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    """Yield a line per case present in both reports with the change in p50 and p99."""
+    old = {(r['rows'], r['case']): r for r in baseline['results']}
+    for r in report['results']:
+        b = old.get((r['rows'], r['case']))
+        if b is None:
+            continue
+        change = [f"{key[:-3]} {b[key]:.2f} -> {r[key]:.2f} ms ({(r[key] / b[key] - 1) if b[key] else 0:+.0%})"
+                  for key in ('p50_ms', 'p99_ms')]
+        yield f"{r['rows']:>10} {r['case']:<30} " + '  '.join(change)
+
+
+# --------------------- Command line ---------------------
+def build_parser():
+    parser = argparse.ArgumentParser(prog='benchmark.py', description='Synthetic data and data-layer benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('generate', help='write a synthetic database')
+    p.add_argument('path')
+    p.add_argument('--rows', type=_count, default=SIZES[0], help='expenses to generate, e.g. 10k or 1M (default: 10k)')
+    p.add_argument('--users', type=int, help='default: rows / 2000, between 10 and 5000')
+    p.add_argument('--years', type=int, default=3, help='history length ending %s (default: 3)' % END_DATE)
+    p.add_argument('--seed', type=int, default=42)
+
+    p = sub.add_parser('run', help='run the benchmarks and print a JSON report')
+    p.add_argument('--rows', type=_count, nargs='+', default=list(SIZES), help='sizes to run (default: 10k 1M 10M)')
+    p.add_argument('--users', type=int, help='default: rows / 2000, between 10 and 5000')
+    p.add_argument('--years', type=int, default=3)
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--data-dir', default=DATA_DIR, help='where generated databases are kept for reuse (default: %(default)s)')
+    p.add_argument('--only', nargs='+', metavar='PREFIX', help='run only cases starting with PREFIX, e.g. chart/')
+    p.add_argument('--out', help='write the report here instead of stdout')
+    p.add_argument('--compare', metavar='REPORT', help='print the change against an earlier report to stderr')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    log = lambda line: print(line, file=sys.stderr, flush=True)
+    if args.command == 'generate':
+        start = time.perf_counter()
+        generate(args.path, args.rows, args.users, args.years, args.seed)
+        log(f'generated {args.rows} rows in {time.perf_counter() - start:.1f} s')
+        return 0
+
+    report = run(args.rows, args.data_dir, args.users, args.years, args.seed, args.only, progress=log)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            for line in compare(report, json.load(f)):
+                log(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
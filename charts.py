@@ -0,0 +1,148 @@
+import tkinter as tk
+from tkinter import ttk
+from datetime import date
+
+# matplotlib is imported by ChartWindow itself; this module is only imported
+# when the user first opens the chart window.
+import database
+from profiling import NULL_SPAN
+
+VIEWS = ('By category', 'Over time', 'Per user', 'Budget vs actual')
+
+
+def fetch_chart_data(view, filters):
+    """Aggregate the data for `view` under the filter tuple (runs on the worker thread)."""
+    user, category, payment, date_from, date_to, search = filters
+    if view == 'By category':
+        return [(c or 'Uncategorised', t) for c, t in database.grouped_totals('category', *filters) if t > 0]
+    if view == 'Over time':
+        return [(m or 'Undated', t) for m, t in database.grouped_totals('month', *filters)]
+    if view == 'Per user':
+        return database.grouped_totals('name', *filters)
+    # budget vs actual is per month: the month the filter ends in, else this month
+    month = date_to[:7] if date_to else date.today().strftime('%Y-%m')
+    return database.budget_overview(month, user)
+
+
+class ChartWindow:
+    """A single, reusable chart window.
+
+    The figure and canvas are created once. Refreshing re-queries the current
+    view under the app's current filters and, when only the values changed,
+    updates the existing bars or line in place instead of rebuilding the plot.
+    Identical results are not redrawn at all.
+    """
+
+    def __init__(self, app):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self.app = app
+        self.win = tk.Toplevel(app.root)
+        self.win.title('Expense Charts')
+        self.win.geometry('700x550')
+
+        bar = ttk.Frame(self.win, padding=4)
+        bar.pack(fill='x')
+        ttk.Label(bar, text='View:').pack(side='left')
+        self.view = tk.StringVar(value=VIEWS[0])
+        ttk.Combobox(bar, textvariable=self.view, values=VIEWS, state='readonly', width=18).pack(side='left', padx=4)
+        self.view.trace_add('write', lambda *_: self.refresh())
+
+        self.fig = Figure(figsize=(6, 5))
+        self.ax = self.fig.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.win)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=1)
+
+        self._shown = None      # (view, data) currently drawn
+        self._draw_span = NULL_SPAN # times the deferred canvas draw, when profiling
+        self.canvas.mpl_connect('draw_event', self._drawn)
+        self._artists = []      # bar containers / lines of the current plot, for in-place updates
+        self.win.protocol('WM_DELETE_WINDOW', self.close)
+
+    @property
+    def is_open(self):
+        return self.win is not None and self.win.winfo_exists()
+
+    def lift(self):
+        self.win.deiconify()
+        self.win.lift()
+
+    def close(self):
+        self.win.destroy()
+        self.win = None
+        self.fig.clear()
+
+    def refresh(self):
+        view, filters = self.view.get(), self.app.current_filters()
+        self.app.executor.submit(self.app.profiler.traced('chart.query', fetch_chart_data), view, filters,
+                                 on_done=lambda data: self._show(view, data), key='chart')
+
+    # --------------------- Drawing ---------------------
+    def _show(self, view, data):
+        if not self.is_open or view != self.view.get() or (view, data) == self._shown:
+            return
+        shown_view, shown_data = self._shown or (None, None)
+        same_labels = view == shown_view and [r[0] for r in data] == [r[0] for r in shown_data]
+        with self.app.profiler.span('chart.build', view=view, points=len(data)):
+            if not (same_labels and data and self._update_in_place(view, data)):
+                self._redraw(view, data)
+        self._shown = (view, data)
+        self._draw_span = self.app.profiler.start('chart.draw', view=view)
+        self.canvas.draw_idle()
+
+    def _drawn(self, event):
+        self._draw_span.end()
+        self._draw_span = NULL_SPAN
+
+    def _update_in_place(self, view, data):
+        if view == 'By category':
+            return False    # pie wedge angles all depend on each other; just redraw
+        if view == 'Over time':
+            self._artists[0].set_ydata([r[1] for r in data])
+        elif view == 'Per user':
+            for rect, (_, total) in zip(self._artists[0], data):
+                rect.set_height(total)
+        else:
+            budgets, actuals = self._artists
+            for rect, (_, budget, _) in zip(budgets, data):
+                rect.set_height(budget)
+            for rect, (_, _, spent) in zip(actuals, data):
+                rect.set_height(spent)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        return True
+
+    def _redraw(self, view, data):
+        ax = self.ax
+        ax.clear()
+        ax.set_aspect('auto') # undo the pie's equal aspect
+        self._artists = []
+        if not data:
+            ax.text(0.5, 0.5, "No expense data to display chart.", horizontalalignment='center', verticalalignment='center', transform=ax.transAxes)
+            ax.set_axis_off()
+            return
+        ax.set_axis_on()
+        labels = [r[0] for r in data]
+        if view == 'By category':
+            ax.pie([r[1] for r in data], labels=labels, autopct='%1.1f%%', startangle=90)
+            ax.axis('equal') # Equal aspect ratio ensures that pie is drawn as a circle.
+            ax.set_title('Expense Distribution by Category')
+        elif view == 'Over time':
+            line, = ax.plot(labels, [r[1] for r in data], marker='o')
+            self._artists = [line]
+            ax.set_title('Spending per Month')
+            ax.tick_params(axis='x', labelrotation=45)
+        elif view == 'Per user':
+            self._artists = [ax.bar(labels, [r[1] for r in data])]
+            ax.set_title('Spending per User')
+            ax.tick_params(axis='x', labelrotation=45)
+        else:
+            xs = range(len(data))
+            self._artists = [ax.bar([x - 0.2 for x in xs], [r[1] for r in data], width=0.4, label='Budget'),
+                             ax.bar([x + 0.2 for x in xs], [r[2] for r in data], width=0.4, label='Spent')]
+            ax.set_xticks(list(xs))
+            ax.set_xticklabels(labels, rotation=45)
+            ax.legend()
+            ax.set_title('Budget vs Actual')
+        self.fig.tight_layout()
@@ -0,0 +1,278 @@
+"""Command-line interface to the expense database. Runs without tkinter or a display.
+
+    python cli.py add Alice 12.50 --category Food
+    python cli.py list --user alice --from 2024-01-01 > alice.csv
+    python cli.py budget status --month 2024-05
+"""
+import argparse
+import csv
+import sqlite3
+import sys
+from datetime import date
+
+import database
+from profiling import Profiler
+
+CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Other']
+PAYMENT_METHODS = ['Cash', 'Card', 'Online']
+
+
+def _positive_amount(text):
+    try:
+        value = float(text)
+    except ValueError:
+        value = -1
+    if value <= 0:
+        raise argparse.ArgumentTypeError('amount must be a positive number')
+    return value
+
+
+def _non_negative_amount(text):
+    try:
+        value = float(text)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise argparse.ArgumentTypeError('budget must be a non-negative number')
+    return value
+
+
+# --------------------- Commands ---------------------
+def cmd_add(args):
+    rec_id = database.add_expense(args.name, args.amount, args.category, args.date, args.notes, args.payment, args.location,
+                                  args.currency)
+    print(rec_id)
+
+
+def cmd_list(args):
+    # rows are written as they are fetched, so output starts immediately and memory stays flat
+    writer = csv.writer(sys.stdout)
+    if not args.no_header:
+        writer.writerow(database.CSV_HEADER)
+    for row in database.iter_expenses(args.user, args.category, args.payment, args.date_from, args.date_to, args.search):
+        writer.writerow(row)
+
+
+def cmd_import(args):
+    formats = args.date_format or database.IMPORT_DATE_FORMATS
+    inserted, duplicates, invalid = database.import_expenses_csv(args.file, date_formats=formats)
+    print(f'Imported {inserted} row(s); skipped {duplicates} duplicate(s) and {invalid} invalid row(s)', file=sys.stderr)
+
+
+def cmd_export(args):
+    if args.file == '-':
+        count = database.write_expenses_csv(sys.stdout, compress=False)
+    else:
+        count = database.write_expenses_csv(args.file)
+    print(f'Exported {count} row(s)', file=sys.stderr)
+
+
+def cmd_budget_status(args):
+    month = args.month or date.today().strftime('%Y-%m')
+    if args.name:
+        spent, budget = database.budget_status(args.name, month)
+        rows = [(args.name, budget, spent)]
+    else:
+        rows = database.budget_overview(month)
+    digits = database.minor_digits(database.base_currency())    # amounts are in the base currency
+    for name, budget, spent in rows:
+        if not budget:
+            print(f'{name}\t{spent:.{digits}f}\tno budget')
+        else:
+            flag = 'OVER' if spent > budget else 'ok'
+            print(f'{name}\t{spent:.{digits}f}\t{budget:.{digits}f}\t{flag}')
+
+
+def cmd_budget_set(args):
+    database.set_budget(args.name, args.amount)
+
+
+def cmd_currency(args):
+    if args.action == 'rate':
+        database.set_exchange_rate(args.code, args.rate)
+    elif args.action == 'base':
+        database.set_base_currency(args.code)
+    base = database.base_currency()
+    for code, rate, updated in database.list_exchange_rates():
+        print(f"{code}\t{rate:.6g}\t{updated or ''}" + ('\tbase' if code == base else ''))
+
+
+def _progress(status, remaining, total):
+    print(f'\r{total - remaining}/{total} pages', end='', file=sys.stderr, flush=True)
+
+
+def cmd_backup(args):
+    progress = _progress if sys.stderr.isatty() else None
+    if args.dest:
+        path = database.backup_to(args.dest, progress=progress)
+    else:
+        path = database.snapshot(args.dir, keep=args.keep, progress=progress)
+    if progress:
+        print(file=sys.stderr)
+    print(path)
+
+
+def cmd_restore(args):
+    database.restore_from(args.src, progress=_progress if sys.stderr.isatty() else None)
+
+
+def cmd_recurring_add(args):
+    print(database.add_recurring_rule(args.name, args.amount, args.category, args.payment, args.notes, args.location,
+                                      args.every, args.interval, args.start, args.end, args.currency))
+
+
+def cmd_recurring_list(args):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['ID', 'Name', 'Amount', 'Category', 'Payment Method', 'Notes', 'Location',
+                     'Cadence', 'Interval', 'Start', 'End', 'Currency', 'Materialized Through'])
+    writer.writerows(database.list_recurring_rules())
+
+
+def cmd_recurring_delete(args):
+    database.delete_recurring_rule(args.id)
+
+
+def cmd_recurring_run(args):
+    inserted = database.materialize_recurring(args.until)
+    print(f'Inserted {inserted} recurring expense(s)', file=sys.stderr)
+
+
+def cmd_totals(args):
+    if args.action == 'rebuild':
+        database.rebuild_monthly_totals()
+    drift = database.verify_monthly_totals()
+    for name, month, category, currency, stored, actual in drift:
+        print(f'{name}\t{month}\t{category}\t{currency}\tstored={stored}\tactual={actual}')
+    if drift:
+        print(f'{len(drift)} monthly total(s) out of sync; run "totals rebuild"', file=sys.stderr)
+        return 1
+
+
+# --------------------- Parser ---------------------
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='Expense tracker command-line interface')
+    parser.add_argument('--db', default=database.DB_FILE, help='database file (default: %(default)s)')
+    parser.add_argument('--profile', metavar='LOG', help='append the command timing and slow SQL statements to LOG as JSON lines')
+    parser.add_argument('--slow-ms', type=float, default=100, help='slow statement threshold for --profile (default: %(default)s)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('add', help='add an expense')
+    p.add_argument('name')
+    p.add_argument('amount', type=_positive_amount)
+    p.add_argument('--category', choices=CATEGORIES, default='Other')
+    p.add_argument('--date', default=date.today().strftime('%Y-%m-%d'), help='YYYY-MM-DD (default: today)')
+    p.add_argument('--payment', choices=PAYMENT_METHODS, default='Cash')
+    p.add_argument('--location', default='')
+    p.add_argument('--notes', default='')
+    p.add_argument('--currency', help='ISO code with an exchange rate (default: the base currency)')
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser('list', help='list expenses as CSV, optionally filtered')
+    p.add_argument('--user', default='', help='name contains')
+    p.add_argument('--category', default='')
+    p.add_argument('--payment', default='')
+    p.add_argument('--from', dest='date_from', default='', help='YYYY-MM-DD')
+    p.add_argument('--to', dest='date_to', default='', help='YYYY-MM-DD')
+    p.add_argument('--search', default='', help='words to find in name, notes or location (prefixes match)')
+    p.add_argument('--no-header', action='store_true')
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser('import', help='bulk-import expenses from a CSV file (.csv or .csv.gz)')
+    p.add_argument('file')
+    p.add_argument('--date-format', action='append', metavar='FORMAT',
+                   help='strptime format of non-ISO dates, e.g. %%m/%%d/%%Y; repeat to try several (default: day first, '
+                        + ' '.join(database.IMPORT_DATE_FORMATS).replace('%', '%%') + ')')
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('export', help='export all expenses to CSV')
+    p.add_argument('file', nargs='?', default=database.CSV_FILE, help="path, .gz to compress, or - for stdout (default: %(default)s)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('budget', help='monthly budgets')
+    budget = p.add_subparsers(dest='budget_command', required=True)
+    p = budget.add_parser('status', help='spending against budget for one user, or all users with a budget')
+    p.add_argument('name', nargs='?')
+    p.add_argument('--month', help='YYYY-MM (default: current month)')
+    p.set_defaults(func=cmd_budget_status)
+    p = budget.add_parser('set', help="set a user's monthly budget")
+    p.add_argument('name')
+    p.add_argument('amount', type=_non_negative_amount)
+    p.set_defaults(func=cmd_budget_set)
+
+    p = sub.add_parser('currency', help='exchange rates and the base currency that totals and budgets are reported in')
+    currency = p.add_subparsers(dest='action', required=True)
+    p = currency.add_parser('list', help='list exchange rates')
+    p.set_defaults(func=cmd_currency)
+    p = currency.add_parser('rate', help='set what one unit of CODE is worth in the base currency')
+    p.add_argument('code')
+    p.add_argument('rate', type=float)
+    p.set_defaults(func=cmd_currency)
+    p = currency.add_parser('base', help='report in CODE from now on (converts budgets; needs a rate for CODE)')
+    p.add_argument('code')
+    p.set_defaults(func=cmd_currency)
+
+    p = sub.add_parser('backup', help='online backup to DEST, or a rotating snapshot when DEST is omitted')
+    p.add_argument('dest', nargs='?')
+    p.add_argument('--dir', default=database.BACKUP_DIR, help='snapshot directory (default: %(default)s)')
+    p.add_argument('--keep', type=int, default=database.BACKUP_KEEP, help='snapshots to keep (default: %(default)s)')
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser('restore', help='replace the database contents with a backup')
+    p.add_argument('src')
+    p.set_defaults(func=cmd_restore)
+
+    p = sub.add_parser('recurring', help='recurring expense rules')
+    recurring = p.add_subparsers(dest='recurring_command', required=True)
+    p = recurring.add_parser('add', help='add a rule; occurrences up to today are inserted by "recurring run" or at app start')
+    p.add_argument('name')
+    p.add_argument('amount', type=_positive_amount)
+    p.add_argument('--every', choices=database.RECURRING_CADENCES, default='monthly')
+    p.add_argument('--interval', type=int, default=1, help='every N days/weeks/months/years (default: 1)')
+    p.add_argument('--start', help='YYYY-MM-DD of the first occurrence (default: today)')
+    p.add_argument('--end', help='YYYY-MM-DD after which the rule stops (default: never)')
+    p.add_argument('--category', choices=CATEGORIES, default='Other')
+    p.add_argument('--payment', choices=PAYMENT_METHODS, default='Cash')
+    p.add_argument('--location', default='')
+    p.add_argument('--notes', default='')
+    p.add_argument('--currency', help='ISO code with an exchange rate (default: the base currency)')
+    p.set_defaults(func=cmd_recurring_add)
+    p = recurring.add_parser('list', help='list rules as CSV')
+    p.set_defaults(func=cmd_recurring_list)
+    p = recurring.add_parser('delete', help='delete a rule (expenses it created are kept)')
+    p.add_argument('id', type=int)
+    p.set_defaults(func=cmd_recurring_delete)
+    p = recurring.add_parser('run', help='insert every occurrence due so far that is not in the database yet')
+    p.add_argument('--until', help='YYYY-MM-DD (default: today)')
+    p.set_defaults(func=cmd_recurring_run)
+
+    p = sub.add_parser('totals', help='check or rebuild the monthly totals summary table')
+    p.add_argument('action', choices=['verify', 'rebuild'])
+    p.set_defaults(func=cmd_totals)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    database.DB_FILE = args.db
+    profiler = Profiler(bool(args.profile), args.profile, args.slow_ms)
+    if profiler.enabled:
+        database.CONNECT_HOOKS.append(profiler.attach)
+    try:
+        with profiler.span('cli.' + args.func.__name__[len('cmd_'):]):
+            database.create_db()
+            status = args.func(args) or 0
+        profiler.flush()
+        return status
+    except BrokenPipeError:
+        # output piped into e.g. `head`; stop quietly
+        sys.stderr.close()
+        return 0
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 1
+    finally:
+        database.close_connections()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
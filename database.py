@@ -1,67 +1,1423 @@
 import sqlite3
 import csv
+import gzip
+import io
+import hashlib
+import os
 import shutil
-from tkinter import messagebox, filedialog
-from datetime import datetime
+import tempfile
+import threading
+import calendar
+import math
+import re
+import string
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 DB_FILE = 'expenses.db'
 CSV_FILE = 'expenses.csv'
 
+# --------------------- Connection Layer ---------------------
+# Pragmas applied to every pooled connection. WAL lets the UI read while a
+# write is in flight, NORMAL sync is safe under WAL, and a larger page cache
+# keeps the hot part of the expenses table in memory between calls.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -65536),  # negative = KiB, so up to 64 MB; bulk index maintenance needs the room
+    ('temp_store', 'MEMORY'),
+)
+# sqlite3 keeps compiled statements per connection keyed on the SQL text, so
+# long-lived connections plus constant query strings give us prepared
+# statement reuse for free.
+STATEMENT_CACHE_SIZE = 256
+QUERY_CACHE_SIZE = 64   # filter results kept per connection (see QueryCache)
+# Called with every newly opened pooled connection, e.g. profiling.Profiler.attach.
+CONNECT_HOOKS = []
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = []          # every open connection, so close_connections() can reach all threads
+_generation = 0     # bumped on close so threads drop their stale handle
+
+
+def _open_connection(path):
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma, value in PRAGMAS:
+        conn.execute(f'PRAGMA {pragma}={value}')
+    for hook in CONNECT_HOOKS:
+        hook(conn)
+    return conn
+
+
+def get_connection():
+    """Return the calling thread's long-lived connection to DB_FILE.
+
+    The connection is opened on first use and reused afterwards. Changing
+    DB_FILE or calling close_connections() makes the next call reconnect.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == DB_FILE and _local.generation == _generation:
+        return conn
+    conn = _open_connection(DB_FILE)
+    with _pool_lock:
+        _pool.append(conn)
+        _local.conn, _local.path, _local.generation = conn, DB_FILE, _generation
+        _local.cache = QueryCache()
+    return conn
+
+
+def close_connections():
+    """Close every pooled connection (e.g. before replacing the DB file)."""
+    global _generation
+    with _pool_lock:
+        for conn in _pool:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _pool.clear()
+        _generation += 1
+
+
+class QueryCache:
+    """LRU cache of read-query results for one pooled connection.
+
+    Every lookup compares the connection's total_changes (writes made through
+    it) and PRAGMA data_version (commits made by any other connection) with the
+    values seen last time, and empties the cache if either moved. So any write
+    to the database invalidates it without the writers having to know about it.
+
+    memo() keeps small lookups that queries are built from (the base currency
+    and exchange rates) under the same check, but apart from the results:
+    they are never evicted and not counted in cache_stats().
+    """
+    hits = 0        # process-wide counters, see cache_stats()
+    misses = 0
+
+    def __init__(self, size=QUERY_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._memo = {}
+        self._stamp = None
+
+    def _check(self, conn):
+        stamp = (conn.total_changes, conn.execute('PRAGMA data_version').fetchone()[0])
+        if stamp != self._stamp:
+            self._entries.clear()
+            self._memo.clear()
+            self._stamp = stamp
+
+    def get(self, conn, key, compute):
+        self._check(conn)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            QueryCache.hits += 1
+            return self._entries[key]
+        QueryCache.misses += 1
+        value = self._entries[key] = compute()
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return value
+
+    def memo(self, conn, key, compute):
+        self._check(conn)
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._memo.clear()
+
+
+def _cached(key, compute):
+    conn = get_connection()
+    return _local.cache.get(conn, key, compute)
+
+
+def _memoized(key, compute):
+    conn = get_connection()
+    return _local.cache.memo(conn, key, compute)
+
+
+def cache_stats():
+    """Return {'hits', 'misses', 'hit_rate'} for the query result cache."""
+    total = QueryCache.hits + QueryCache.misses
+    return {'hits': QueryCache.hits, 'misses': QueryCache.misses,
+            'hit_rate': QueryCache.hits / total if total else 0.0}
+
+
+def clear_query_cache():
+    """Empty the calling thread's query cache, e.g. to time queries uncached."""
+    get_connection()
+    _local.cache.clear()
+
+
+@contextmanager
+def transaction():
+    """Yield the pooled connection inside a transaction; commit on success, roll back on error."""
+    conn = get_connection()
+    with conn:
+        yield conn
+
 # --------------------- Database Setup ---------------------
-def create_db():
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS expenses
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      name TEXT NOT NULL,
-                      amount REAL NOT NULL,
-                      category TEXT,
-                      date TEXT,
-                      notes TEXT,
-                      payment_method TEXT,
-                      location TEXT)''')
-        c.execute('''CREATE TABLE IF NOT EXISTS budgets
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      name TEXT NOT NULL UNIQUE,
-                      monthly_budget REAL DEFAULT 0)''')
-        conn.commit()
+# The version 0 schema that MIGRATIONS builds on.
+_BASE_TABLES = (
+    '''CREATE TABLE IF NOT EXISTS expenses
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        amount REAL NOT NULL,
+        category TEXT,
+        date TEXT,
+        notes TEXT,
+        payment_method TEXT,
+        location TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS budgets
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        monthly_budget REAL DEFAULT 0)''',
+)
 
-# --------------------- Utilities ---------------------
 
-def export_db_to_csv(path=None):
-    """Export current DB expenses table to CSV file. If path None, uses CSV_FILE."""
-    path = path or CSV_FILE
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        c.execute("SELECT * FROM expenses ORDER BY date ASC")
-        rows = c.fetchall()
-    if not rows:
-        messagebox.showinfo("Export", "No data to export")
+def create_db(upgrade=True):
+    """Create the base tables if missing, then apply pending migrations.
+
+    upgrade=False stops at the base (version 0) schema. Bulk loads into a new
+    file can insert there and call migrate() afterwards, which builds each
+    index, the monthly totals and the search index in one pass.
+    """
+    with transaction() as conn:
+        for sql in _BASE_TABLES:
+            conn.execute(sql)
+    if upgrade:
+        migrate()
+
+# --------------------- Migrations ---------------------
+# Schema changes applied on top of the base tables above. Entry N upgrades a
+# database from user_version N to N+1; each step is a list of SQL strings or
+# callables taking the connection. Only ever append to this list.
+MIGRATIONS = [
+    # 1: secondary indexes for the filter bar, user list and budget check
+    [
+        'CREATE INDEX IF NOT EXISTS idx_expenses_name_date ON expenses(name, date)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses(category, date)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_payment_date ON expenses(payment_method, date)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)',
+    ],
+    # 2: per user/month/category running totals, maintained by triggers
+    [
+        '''CREATE TABLE IF NOT EXISTS monthly_totals
+           (name TEXT NOT NULL,
+            month TEXT NOT NULL,      -- YYYY-MM
+            category TEXT NOT NULL,   -- '' for uncategorised
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, month, category)) WITHOUT ROWID''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_expenses_totals_ins AFTER INSERT ON expenses BEGIN
+               INSERT INTO monthly_totals (name, month, category, total, count)
+               VALUES (NEW.name, substr(IFNULL(NEW.date, ''), 1, 7), IFNULL(NEW.category, ''), NEW.amount, 1)
+               ON CONFLICT (name, month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_expenses_totals_del AFTER DELETE ON expenses BEGIN
+               UPDATE monthly_totals SET total = total - OLD.amount, count = count - 1
+               WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '');
+               DELETE FROM monthly_totals
+               WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '') AND count <= 0;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_expenses_totals_upd AFTER UPDATE OF name, amount, category, date ON expenses BEGIN
+               UPDATE monthly_totals SET total = total - OLD.amount, count = count - 1
+               WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '');
+               DELETE FROM monthly_totals
+               WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '') AND count <= 0;
+               INSERT INTO monthly_totals (name, month, category, total, count)
+               VALUES (NEW.name, substr(IFNULL(NEW.date, ''), 1, 7), IFNULL(NEW.category, ''), NEW.amount, 1)
+               ON CONFLICT (name, month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+           END''',
+        '''INSERT INTO monthly_totals (name, month, category, total, count)
+           SELECT name, substr(IFNULL(date, ''), 1, 7), IFNULL(category, ''), SUM(amount), COUNT(*)
+           FROM expenses GROUP BY 1, 2, 3''',
+    ],
+    # 3: content hash of imported rows so re-importing a statement is a no-op, and
+    #    a switch that lets bulk loads update monthly_totals per batch instead of per row
+    [
+        'ALTER TABLE expenses ADD COLUMN import_hash TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_import_hash ON expenses(import_hash) WHERE import_hash IS NOT NULL',
+        'CREATE TABLE IF NOT EXISTS totals_sync (deferred INTEGER NOT NULL)',
+        'INSERT INTO totals_sync (deferred) VALUES (0)',
+        'DROP TRIGGER IF EXISTS trg_expenses_totals_ins',
+        '''CREATE TRIGGER trg_expenses_totals_ins AFTER INSERT ON expenses
+           WHEN (SELECT deferred FROM totals_sync) = 0 BEGIN
+               INSERT INTO monthly_totals (name, month, category, total, count)
+               VALUES (NEW.name, substr(IFNULL(NEW.date, ''), 1, 7), IFNULL(NEW.category, ''), NEW.amount, 1)
+               ON CONFLICT (name, month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+           END''',
+    ],
+    # 4: full-text index over name, notes and location (when SQLite has FTS5)
+    [
+        lambda conn: _create_fts(conn),
+    ],
+    # 5: recurring expense rules, materialized into expenses by materialize_recurring()
+    [
+        '''CREATE TABLE IF NOT EXISTS recurring_rules
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT,
+            payment_method TEXT,
+            notes TEXT,
+            location TEXT,
+            cadence TEXT NOT NULL,             -- daily | weekly | monthly | yearly
+            interval INTEGER NOT NULL DEFAULT 1,
+            start_date TEXT NOT NULL,          -- YYYY-MM-DD, the first occurrence
+            end_date TEXT,                     -- last day an occurrence may fall on; NULL = open-ended
+            materialized_through TEXT)''',     # occurrences up to this date are already in expenses
+    ],
+    # 6: amounts in integer minor units with a currency per expense, exchange
+    #    rates to a chosen base currency, and monthly_totals kept per currency
+    [
+        lambda conn: _migrate_to_minor_units(conn),
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _expense_columns(version):
+    """Return the expenses column names at schema `version`, by replaying the
+    migrations up to it on an empty in-memory database."""
+    conn = sqlite3.connect(':memory:')
+    try:
+        for sql in _BASE_TABLES:
+            conn.execute(sql)
+        for steps in MIGRATIONS[:version]:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+        return [row[1] for row in conn.execute('PRAGMA table_info(expenses)')]
+    finally:
+        conn.close()
+
+
+def _create_fts(conn):
+    # FTS5 is compiled into nearly every SQLite build, but not all; without it
+    # the search filter falls back to LIKE and this step is a no-op.
+    try:
+        conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)')
+        conn.execute('DROP TABLE temp.fts5_probe')
+    except sqlite3.OperationalError:
         return
-    with open(path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['ID', 'Name', 'Amount', 'Category', 'Date', 'Notes', 'Payment Method', 'Location'])
-        writer.writerows(rows)
-    messagebox.showinfo("Export", f"Exported {len(rows)} rows to {path}")
+    for sql in _FTS_SCHEMA:
+        conn.execute(sql)
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+
+# External-content FTS5 index over the text columns of expenses, kept in sync by triggers.
+_FTS_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5
+       (name, notes, location, content='expenses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_ins AFTER INSERT ON expenses BEGIN
+           INSERT INTO expenses_fts (rowid, name, notes, location) VALUES (NEW.id, NEW.name, NEW.notes, NEW.location);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_del AFTER DELETE ON expenses BEGIN
+           INSERT INTO expenses_fts (expenses_fts, rowid, name, notes, location) VALUES ('delete', OLD.id, OLD.name, OLD.notes, OLD.location);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_upd AFTER UPDATE OF name, notes, location ON expenses BEGIN
+           INSERT INTO expenses_fts (expenses_fts, rowid, name, notes, location) VALUES ('delete', OLD.id, OLD.name, OLD.notes, OLD.location);
+           INSERT INTO expenses_fts (rowid, name, notes, location) VALUES (NEW.id, NEW.name, NEW.notes, NEW.location);
+       END''',
+]
+
+
+# monthly_totals maintenance from migration 6 on: one row per user/month/category/currency.
+_TOTALS_TRIGGERS = [
+    '''CREATE TRIGGER trg_expenses_totals_ins AFTER INSERT ON expenses
+       WHEN (SELECT deferred FROM totals_sync) = 0 BEGIN
+           INSERT INTO monthly_totals (name, month, category, currency, total, count)
+           VALUES (NEW.name, substr(IFNULL(NEW.date, ''), 1, 7), IFNULL(NEW.category, ''), NEW.currency, NEW.amount, 1)
+           ON CONFLICT (name, month, category, currency) DO UPDATE SET total = total + excluded.total, count = count + 1;
+       END''',
+    '''CREATE TRIGGER trg_expenses_totals_del AFTER DELETE ON expenses BEGIN
+           UPDATE monthly_totals SET total = total - OLD.amount, count = count - 1
+           WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '') AND currency = OLD.currency;
+           DELETE FROM monthly_totals
+           WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '') AND currency = OLD.currency AND count <= 0;
+       END''',
+    '''CREATE TRIGGER trg_expenses_totals_upd AFTER UPDATE OF name, amount, category, date, currency ON expenses BEGIN
+           UPDATE monthly_totals SET total = total - OLD.amount, count = count - 1
+           WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '') AND currency = OLD.currency;
+           DELETE FROM monthly_totals
+           WHERE name = OLD.name AND month = substr(IFNULL(OLD.date, ''), 1, 7) AND category = IFNULL(OLD.category, '') AND currency = OLD.currency AND count <= 0;
+           INSERT INTO monthly_totals (name, month, category, currency, total, count)
+           VALUES (NEW.name, substr(IFNULL(NEW.date, ''), 1, 7), IFNULL(NEW.category, ''), NEW.currency, NEW.amount, 1)
+           ON CONFLICT (name, month, category, currency) DO UPDATE SET total = total + excluded.total, count = count + 1;
+       END''',
+]
+
+
+def _rebuild_table(conn, table, create_sql, copy_select, params=()):
+    # SQLite cannot change a column's type: create the new table, copy, drop
+    # the old one and rename. Its indexes and triggers go with the old table,
+    # so they are replayed, except the monthly_totals triggers (replaced).
+    keep = conn.execute('''SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger')
+                           AND sql IS NOT NULL AND name NOT LIKE 'trg_expenses_totals_%' ''', (table,)).fetchall()
+    seq = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+    conn.execute(create_sql.format(table=f'{table}_new'))
+    conn.execute(f'INSERT INTO {table}_new {copy_select}', params)
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    if seq:     # keep AUTOINCREMENT from reusing ids of rows deleted from the end
+        conn.execute('UPDATE sqlite_sequence SET seq = ? WHERE name = ?', (seq[0], table))
+    for (sql,) in keep:
+        conn.execute(sql)
+
+
+def _migrate_to_minor_units(conn):
+    # existing amounts and budgets are taken to be in DEFAULT_CURRENCY
+    scale = 10 ** minor_digits(DEFAULT_CURRENCY)
+    conn.execute('CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+    conn.execute("INSERT INTO settings (key, value) VALUES ('base_currency', ?)", (DEFAULT_CURRENCY,))
+    conn.execute('''CREATE TABLE exchange_rates
+                    (currency TEXT PRIMARY KEY,   -- ISO 4217 code
+                     rate REAL NOT NULL,          -- value of one unit in the base currency
+                     updated TEXT)''')
+    conn.execute("INSERT INTO exchange_rates (currency, rate, updated) VALUES (?, 1.0, date('now'))", (DEFAULT_CURRENCY,))
+
+    _rebuild_table(conn, 'expenses',
+                   '''CREATE TABLE {table}
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       name TEXT NOT NULL,
+                       amount INTEGER NOT NULL,   -- minor units (cents) of currency
+                       currency TEXT NOT NULL,
+                       category TEXT,
+                       date TEXT,
+                       notes TEXT,
+                       payment_method TEXT,
+                       location TEXT,
+                       import_hash TEXT)''',
+                   '''SELECT id, name, CAST(ROUND(amount * ?) AS INTEGER), ?, category, date, notes, payment_method, location, import_hash
+                      FROM expenses''', (scale, DEFAULT_CURRENCY))
+    _rebuild_table(conn, 'budgets',
+                   '''CREATE TABLE {table}
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       name TEXT NOT NULL UNIQUE,
+                       monthly_budget INTEGER DEFAULT 0)  -- minor units of the base currency''',
+                   'SELECT id, name, CAST(ROUND(monthly_budget * ?) AS INTEGER) FROM budgets', (scale,))
+    _rebuild_table(conn, 'recurring_rules',
+                   '''CREATE TABLE {table}
+                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                       name TEXT NOT NULL,
+                       amount INTEGER NOT NULL,           -- minor units of currency
+                       currency TEXT NOT NULL,
+                       category TEXT,
+                       payment_method TEXT,
+                       notes TEXT,
+                       location TEXT,
+                       cadence TEXT NOT NULL,             -- daily | weekly | monthly | yearly
+                       interval INTEGER NOT NULL DEFAULT 1,
+                       start_date TEXT NOT NULL,          -- YYYY-MM-DD, the first occurrence
+                       end_date TEXT,                     -- last day an occurrence may fall on; NULL = open-ended
+                       materialized_through TEXT)         -- occurrences up to this date are already in expenses''',
+                   '''SELECT id, name, CAST(ROUND(amount * ?) AS INTEGER), ?, category, payment_method, notes, location,
+                             cadence, interval, start_date, end_date, materialized_through FROM recurring_rules''',
+                   (scale, DEFAULT_CURRENCY))
+
+    conn.execute('DROP TABLE monthly_totals')
+    conn.execute('''CREATE TABLE monthly_totals
+                    (name TEXT NOT NULL,
+                     month TEXT NOT NULL,      -- YYYY-MM
+                     category TEXT NOT NULL,   -- '' for uncategorised
+                     currency TEXT NOT NULL,
+                     total INTEGER NOT NULL DEFAULT 0,   -- minor units of currency
+                     count INTEGER NOT NULL DEFAULT 0,
+                     PRIMARY KEY (name, month, category, currency)) WITHOUT ROWID''')
+    for sql in _TOTALS_TRIGGERS:
+        conn.execute(sql)
+    _fill_monthly_totals(conn)
+
+
+def schema_version():
+    return get_connection().execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate():
+    """Bring an existing DB up to SCHEMA_VERSION in place, one transaction per step."""
+    conn = get_connection()
+    version = schema_version()
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f'{DB_FILE} has schema version {version}, newer than this app ({SCHEMA_VERSION})')
+    for target, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute('BEGIN')
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version={target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# --------------------- Monthly Totals ---------------------
+# Source of truth for what monthly_totals should contain; used for the initial
+# backfill, rebuild and verification. NOT INDEXED keeps `id > ?` a rowid range
+# scan instead of a full walk of the (name, date) index.
+_MONTHLY_TOTALS_SQL = '''SELECT name, substr(IFNULL(date, ''), 1, 7) AS month, IFNULL(category, '') AS category,
+                                currency, SUM(amount), COUNT(*)
+                         FROM expenses NOT INDEXED WHERE {where} GROUP BY 1, 2, 3, 4'''
+
+
+def _fill_monthly_totals(conn):
+    conn.execute('DELETE FROM monthly_totals')
+    conn.execute('INSERT INTO monthly_totals (name, month, category, currency, total, count) '
+                 + _MONTHLY_TOTALS_SQL.format(where='1'))
+
 
+def _add_to_monthly_totals(conn, after_id):
+    """Fold expenses with id > after_id into monthly_totals (for rows inserted while deferred)."""
+    conn.execute('INSERT INTO monthly_totals (name, month, category, currency, total, count) '
+                 + _MONTHLY_TOTALS_SQL.format(where='id > ?')
+                 + ' ON CONFLICT (name, month, category, currency) DO UPDATE SET total = total + excluded.total, count = count + excluded.count',
+                 (after_id,))
 
-def backup_database():
-    dest = filedialog.asksaveasfilename(defaultextension='.db', filetypes=[('SQLite DB','*.db'),('All files','*.*')])
-    if not dest:
+
+def rebuild_monthly_totals():
+    """Recompute monthly_totals from the expenses table."""
+    with transaction() as conn:
+        _fill_monthly_totals(conn)
+
+
+def verify_monthly_totals():
+    """Compare monthly_totals against a fresh aggregate of expenses.
+
+    Returns a list of (name, month, category, currency, stored_total, actual_total)
+    for every key whose total or count differs; an empty list means no drift.
+    Totals are integer minor units, so they must match exactly.
+    """
+    conn = get_connection()
+    actual = {r[:4]: r[4:] for r in conn.execute(_MONTHLY_TOTALS_SQL.format(where='1'))}
+    stored = {r[:4]: r[4:] for r in conn.execute('SELECT name, month, category, currency, total, count FROM monthly_totals')}
+    drift = []
+    for key in actual.keys() | stored.keys():
+        s_total, s_count = stored.get(key, (None, 0))
+        a_total, a_count = actual.get(key, (None, 0))
+        if s_count != a_count or s_total != a_total:
+            drift.append((*key, s_total, a_total))
+    return sorted(drift)
+
+
+def fts_available():
+    """True if the full-text index exists in this database."""
+    return get_connection().execute("SELECT 1 FROM sqlite_master WHERE name='expenses_fts'").fetchone() is not None
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must match, each as a prefix.
+
+    'cof star' -> '"cof"* "star"*', which finds 'Coffee at Starbucks'. Words
+    are quoted so punctuation typed by the user is never parsed as FTS syntax.
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in text.split())
+
+
+def explain_query_plan(sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for `sql`."""
+    return [row[3] for row in get_connection().execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+# --------------------- Currencies ---------------------
+# Amounts are stored as integers in the minor unit of their currency (cents,
+# pence, yen). Totals, budgets and charts are reported in the base currency,
+# converting each currency at its rate in exchange_rates.
+DEFAULT_CURRENCY = 'USD'
+# ISO 4217 minor unit digits, for the currencies that do not use 2
+_MINOR_DIGITS = {'BHD': 3, 'CLP': 0, 'IQD': 3, 'ISK': 0, 'JOD': 3, 'JPY': 0, 'KRW': 0,
+                 'KWD': 3, 'LYD': 3, 'OMR': 3, 'PYG': 0, 'TND': 3, 'UGX': 0, 'VND': 0}
+_CURRENCY_CODE = re.compile(r'[A-Z]{3}')
+# the stored minor-unit amount of a row as major-unit text, e.g. 1250 USD -> '12.50'.
+# Two-digit currencies skip the per-currency CASEs, which matters for full exports.
+_AMOUNT_SQL = ("CASE WHEN currency IN ({}) THEN printf('%.*f', CASE currency {} END, amount * 1.0 / CASE currency {} END) "
+               "ELSE printf('%.2f', amount / 100.0) END").format(
+    ', '.join(f"'{c}'" for c in _MINOR_DIGITS),
+    ' '.join(f"WHEN '{c}' THEN {d}" for c, d in _MINOR_DIGITS.items()),
+    ' '.join(f"WHEN '{c}' THEN {10 ** d}" for c, d in _MINOR_DIGITS.items()))
+
+
+def minor_digits(currency):
+    return _MINOR_DIGITS.get(currency, 2)
+
+
+MINOR_UNITS_LIMIT = 2 ** 63     # SQLite INTEGER is a signed 64-bit value
+
+
+def to_minor(amount, currency):
+    """Convert a major-unit amount (number or numeric text) to integer minor units, rounding half up.
+
+    Raises ValueError for text that is not a number and for amounts too large to store.
+    """
+    try:
+        value = Decimal(str(amount).strip()).scaleb(minor_digits(currency)).quantize(Decimal(1), ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f'invalid amount: {amount!r}') from None
+    if not value.is_finite() or abs(value) >= MINOR_UNITS_LIMIT:
+        raise ValueError(f'amount out of range: {amount!r}')
+    return int(value)
+
+
+def _currency_settings():
+    # (base currency, {currency: rate}), read once and then memoized until the next write
+    def read():
+        conn = get_connection()
+        return (conn.execute("SELECT value FROM settings WHERE key = 'base_currency'").fetchone()[0],
+                dict(conn.execute('SELECT currency, rate FROM exchange_rates')))
+    return _memoized('currencies', read)
+
+
+def base_currency():
+    return _currency_settings()[0]
+
+
+def exchange_rates():
+    """Return {currency: rate}, the value of one unit of each currency in the base currency.
+
+    Read once and then memoized by the query cache until the next write, so
+    building conversion SQL for every aggregate costs no extra queries.
+    """
+    return _currency_settings()[1]
+
+
+def _known_currency(currency):
+    """Return the currency code to store (None or '' means the base currency);
+    ValueError if there is no exchange rate for it."""
+    code = (currency or '').strip().upper() or base_currency()
+    if code not in exchange_rates():
+        raise ValueError(f'no exchange rate for {code}; add one first')
+    return code
+
+
+def set_exchange_rate(currency, rate):
+    """Set what one unit of `currency` is worth in the base currency."""
+    code = currency.strip().upper()
+    if not _CURRENCY_CODE.fullmatch(code):
+        raise ValueError(f'not a currency code: {currency!r}')
+    if code == base_currency():
+        raise ValueError(f'{code} is the base currency; its rate is always 1')
+    if not (math.isfinite(rate) and rate > 0):
+        raise ValueError('rate must be a positive number')
+    with transaction() as conn:
+        conn.execute('''INSERT INTO exchange_rates (currency, rate, updated) VALUES (?, ?, date('now'))
+                        ON CONFLICT (currency) DO UPDATE SET rate = excluded.rate, updated = excluded.updated''',
+                     (code, float(rate)))
+
+
+def list_exchange_rates():
+    """Return (currency, rate, updated) rows, base currency first."""
+    return get_connection().execute('''SELECT currency, rate, updated FROM exchange_rates
+                                       ORDER BY currency != (SELECT value FROM settings WHERE key = 'base_currency'), currency''').fetchall()
+
+
+def set_base_currency(currency):
+    """Report totals and budgets in `currency` from now on.
+
+    It needs an exchange rate against the current base. All rates are
+    re-expressed against the new base and budgets are converted to it.
+    """
+    code = _known_currency(currency)
+    old = base_currency()
+    if code == old:
         return
+    with transaction() as conn:
+        rate = exchange_rates()[code]
+        conn.execute('UPDATE exchange_rates SET rate = rate / ?', (rate,))
+        conn.execute('UPDATE budgets SET monthly_budget = CAST(ROUND(monthly_budget * ?) AS INTEGER)',
+                     (10 ** (minor_digits(code) - minor_digits(old)) / rate,))
+        conn.execute("UPDATE settings SET value = ? WHERE key = 'base_currency'", (code,))
+
+
+def _base_total_sql(amount='amount', currency='currency'):
+    """Return (sql, params): the sum of `amount` (minor units of `currency`) in base-currency major units.
+
+    The factor for each currency comes from the cached rates and goes into
+    a CASE, so SQLite converts while it aggregates, in one pass with no join
+    and no Python call per row. Codes and factors are bound parameters, so
+    they come before the statement's own. Base-currency rows are summed as
+    integers, and the sum is rounded to a whole minor unit.
+    """
+    base, rates = _currency_settings()
+    digits = minor_digits(base)
+    params = []
+    for code, rate in sorted(rates.items()):
+        if code != base:
+            params += [code, rate * 10 ** (digits - minor_digits(code))]
+    whens = f' WHEN ? THEN {amount} * ?' * (len(params) // 2)
+    expr = f'CASE {currency}{whens} ELSE {amount} END' if whens else amount
+    return f'ROUND(IFNULL(SUM({expr}), 0)) / {10 ** digits}.0', params
+
+
+def _budget_sql(column='monthly_budget'):
+    """SQL for a stored budget (base-currency minor units) in major units."""
+    return f'{column} / {10 ** minor_digits(base_currency())}.0'
+
+# --------------------- Data Access ---------------------
+# Rows carry the amount as major-unit text in its own currency, e.g. '12.50'.
+EXPENSE_COLUMNS = ('id', 'name', 'amount', 'category', 'date', 'notes', 'payment_method', 'location', 'currency')
+_SELECT_EXPENSES = f"SELECT id, name, {_AMOUNT_SQL}, category, date, notes, payment_method, location, currency FROM expenses"
+
+
+def filter_clause(user='', category='', payment='', date_from='', date_to='', search=''):
+    """Build the WHERE clause and parameters for the expense filters. Empty values are ignored.
+
+    `search` is a full-text query over name, notes and location (see fts_query).
+    """
+    where = "WHERE 1=1"
+    params = []
+    if search:
+        if fts_available():
+            where += " AND id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)"
+            params.append(fts_query(search))
+        else:
+            for term in search.split():
+                where += " AND (name LIKE ? OR notes LIKE ? OR location LIKE ?)"
+                params.extend([f"%{term}%"] * 3)
+    if user:
+        where += " AND name LIKE ?"
+        params.append(f"%{user}%")
+    if category:
+        where += " AND category = ?"
+        params.append(category)
+    if payment:
+        where += " AND payment_method = ?"
+        params.append(payment)
+    if date_from:
+        where += " AND date >= ?"
+        params.append(date_from)
+    if date_to:
+        where += " AND date <= ?"
+        params.append(date_to)
+    return where, params
+
+
+def iter_expenses(user='', category='', payment='', date_from='', date_to='', search='', batch_size=1000):
+    """Yield matching expenses oldest first, fetching `batch_size` rows at a time."""
+    where, params = filter_clause(user, category, payment, date_from, date_to, search)
+    cur = get_connection().execute(f"{_SELECT_EXPENSES} {where} ORDER BY date ASC, id ASC", params)
+    while True:
+        batch = cur.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+# SQLite's LIKE ignores case for ASCII letters only
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def normalize_filters(user='', category='', payment='', date_from='', date_to='', search=''):
+    """Canonical form of a filter tuple, used as the cache key so equivalent filters share an entry.
+
+    Only differences the queries ignore are folded: surrounding spaces, ASCII
+    case in the user and search filters and the spacing between search words.
+    The queries themselves get the filters as typed (see _stripped).
+    """
+    return (user.strip().translate(_ASCII_LOWER), category.strip(), payment.strip(),
+            date_from.strip(), date_to.strip(), ' '.join(search.split()).translate(_ASCII_LOWER))
+
+
+def _stripped(*filters):
+    return tuple(value.strip() for value in filters)
+
+
+def count_expenses(user='', category='', payment='', date_from='', date_to='', search=''):
+    filters = _stripped(user, category, payment, date_from, date_to, search)
+    return _cached(('count', normalize_filters(*filters)), lambda: _count_expenses(*filters))
+
+
+def _count_expenses(user, category, payment, date_from, date_to, search):
+    if search and not (user or category or payment or date_from or date_to) and fts_available():
+        # text search alone: the FTS index can count its matches without touching expenses
+        return get_connection().execute("SELECT COUNT(*) FROM expenses_fts WHERE expenses_fts MATCH ?",
+                                        (fts_query(search),)).fetchone()[0]
+    where, params = filter_clause(user, category, payment, date_from, date_to, search)
+    return get_connection().execute(f"SELECT COUNT(*) FROM expenses {where}", params).fetchone()[0]
+
+
+def query_expenses_page(user='', category='', payment='', date_from='', date_to='', search='', after=None, limit=200):
+    """Return up to `limit` matching expenses ordered by (date, id), starting after the
+    (date, id) key of the last row of the previous page. Pass after=None for the first page.
+
+    Keyset pagination keeps every page an index seek, however deep the user scrolls.
+    """
+    filters = _stripped(user, category, payment, date_from, date_to, search)
+    after = tuple(after) if after is not None else None
+    return _cached(('page', normalize_filters(*filters), after, limit), lambda: _query_expenses_page(*filters, after, limit))
+
+
+def _keyset_clause(after):
+    """The ' AND ...' condition and parameters for rows after the (date, id) key `after`."""
+    if after is None:
+        return '', []
+    if after[0] is None:
+        # NULL dates sort first, and a row-value comparison with NULL is NULL:
+        # the rest of the undated rows, then every dated one
+        return " AND (date IS NOT NULL OR id > ?)", [after[1]]
+    return " AND (date, id) > (?, ?)", list(after)
+
+
+def _query_expenses_page(user, category, payment, date_from, date_to, search, after, limit):
+    if search and fts_available():
+        # the count is already cached by the time the UI asks for a page
+        matches = count_expenses(user, category, payment, date_from, date_to, search)
+        total = get_connection().execute('SELECT IFNULL(MAX(id), 0) FROM expenses').fetchone()[0]
+        # walking the date index reads about limit * total / matches rows; sorting reads every match
+        if matches and matches * matches > limit * total:
+            return _search_page_by_date(user, category, payment, date_from, date_to, search, after, limit,
+                                        chunk=limit * total // matches * 3 // 2)
+    where, params = filter_clause(user, category, payment, date_from, date_to, search)
+    key_sql, key_params = _keyset_clause(after)
+    return get_connection().execute(f"{_SELECT_EXPENSES} {where}{key_sql} ORDER BY date ASC, id ASC LIMIT ?",
+                                    [*params, *key_params, limit]).fetchall()
+
+
+SEARCH_CHUNK_MAX = 50000    # ids walked per full-text probe, at most
+
+
+def _search_page_by_date(user, category, payment, date_from, date_to, search, after, limit, chunk):
+    """A page of a search with many matches, without fetching and sorting all of them.
+
+    Walks idx_expenses_date in (date, id) order, `chunk` ids at a time, and
+    asks the full-text index which of those ids match, restricted to the
+    chunk's rowid range so FTS5 only reads that part of each doclist. Stops
+    once `limit` rows are found; `chunk` is sized so that is usually the
+    first probe.
+    """
+    conn = get_connection()
+    query = fts_query(search)
+    where, params = filter_clause(user, category, payment, date_from, date_to)
+    key_sql, key_params = _keyset_clause(after)
+    chunk = max(limit, min(chunk, SEARCH_CHUNK_MAX))
+    cur = conn.execute(f"SELECT id FROM expenses INDEXED BY idx_expenses_date {where}{key_sql} ORDER BY date ASC, id ASC",
+                       [*params, *key_params])
+    ids = []
     try:
-        shutil.copyfile(DB_FILE, dest)
-        messagebox.showinfo('Backup', f'Database backed up to {dest}')
-    except Exception as e:
-        messagebox.showerror('Backup Error', str(e))
+        while len(ids) < limit:
+            walked = [r[0] for r in cur.fetchmany(chunk)]
+            if not walked:
+                break
+            hits = {r[0] for r in conn.execute('SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ? AND rowid BETWEEN ? AND ?',
+                                               (query, min(walked), max(walked)))}
+            ids += [i for i in walked if i in hits]
+    finally:
+        cur.close()
+    ids = ids[:limit]
+    if not ids:
+        return []
+    return conn.execute(f"{_SELECT_EXPENSES} WHERE id IN ({','.join('?' * len(ids))}) ORDER BY date ASC, id ASC", ids).fetchall()
+
+
+def user_summaries(month, names=None):
+    """Return (name, spent, budget) for `month` (YYYY-MM) for every user with expenses,
+    or only for those of `names` that still have expenses. budget is None if unset.
+
+    Names come from monthly_totals, which holds one row per user/month/category,
+    so this never scans expenses.
+    """
+    where, params = '', []
+    if names is not None:
+        names = list(names)
+        if not names:
+            return []
+        where = f"WHERE name IN ({','.join('?' * len(names))})"
+        params = names
+    total, total_params = _base_total_sql('t.total', 't.currency')
+    return get_connection().execute(f'''SELECT u.name, {total}, {_budget_sql('b.monthly_budget')}
+                                        FROM (SELECT DISTINCT name FROM monthly_totals {where}) u
+                                        LEFT JOIN monthly_totals t ON t.name = u.name AND t.month = ?
+                                        LEFT JOIN budgets b ON b.name = u.name
+                                        GROUP BY u.name ORDER BY u.name COLLATE NOCASE''', [*total_params, *params, month]).fetchall()
+
+
+def add_expense(name, amount, category, date, notes, payment_method, location, currency=None):
+    """Add an expense of `amount` (major units) in `currency` (default: the base currency)."""
+    currency = _known_currency(currency)
+    with transaction() as conn:
+        cur = conn.execute('''INSERT INTO expenses (name, amount, currency, category, date, notes, payment_method, location)
+                              VALUES (?,?,?,?,?,?,?,?)''',
+                           (name, to_minor(amount, currency), currency, category, date, notes, payment_method, location))
+    return cur.lastrowid
+
+
+def update_expense(rec_id, name, amount, category, date, notes, payment_method, location, currency=None):
+    """Replace an expense's fields. currency=None keeps its current currency.
+
+    Raises ValueError if there is no expense with that id.
+    """
+    with transaction() as conn:
+        row = conn.execute('SELECT currency FROM expenses WHERE id=?', (rec_id,)).fetchone()
+        if row is None:
+            raise ValueError(f'no expense with id {rec_id}')
+        currency = _known_currency(row[0] if currency is None else currency)
+        conn.execute('''UPDATE expenses SET name=?, amount=?, currency=?, category=?, date=?, notes=?, payment_method=?, location=?
+                        WHERE id=?''',
+                     (name, to_minor(amount, currency), currency, category, date, notes, payment_method, location, rec_id))
+
+
+# --------------------- Bulk Operations ---------------------
+# Each bulk operation loads the selected ids into a temp table and runs one
+# set-based statement against it, all inside a single transaction. Each
+# returns the set of user names whose rows it touched, before and after
+# (shift_dates together with the number of rows it could not shift).
+
+def _stage_ids(conn, ids):
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS bulk_ids (id INTEGER PRIMARY KEY)')
+    conn.execute('DELETE FROM temp.bulk_ids')
+    conn.executemany('INSERT OR IGNORE INTO temp.bulk_ids (id) VALUES (?)', [(int(i),) for i in ids])
+
+
+def _staged_names(conn):
+    return {r[0] for r in conn.execute('SELECT DISTINCT name FROM expenses WHERE id IN (SELECT id FROM temp.bulk_ids)')}
+
+
+def delete_expenses(ids):
+    with transaction() as conn:
+        _stage_ids(conn, ids)
+        names = _staged_names(conn)
+        conn.execute('DELETE FROM expenses WHERE id IN (SELECT id FROM temp.bulk_ids)')
+    return names
+
+
+def bulk_update(ids, category=None, payment_method=None):
+    """Set the category and/or payment method of every expense in `ids`."""
+    sets, params = [], []
+    if category is not None:
+        sets.append('category = ?')
+        params.append(category)
+    if payment_method is not None:
+        sets.append('payment_method = ?')
+        params.append(payment_method)
+    if not sets:
+        raise ValueError('nothing to update')
+    with transaction() as conn:
+        _stage_ids(conn, ids)
+        names = _staged_names(conn)
+        conn.execute(f"UPDATE expenses SET {', '.join(sets)} WHERE id IN (SELECT id FROM temp.bulk_ids)", params)
+    return names
+
+
+def shift_dates(ids, days):
+    """Move the date of every expense in `ids` by `days` (negative moves it earlier).
+
+    Only YYYY-MM-DD dates can be shifted; rows with no date or any other
+    text are left alone. Returns (names, skipped) with the number of such rows.
+    """
+    with transaction() as conn:
+        _stage_ids(conn, ids)
+        names = _staged_names(conn)
+        # date() returns NULL for anything it cannot parse, which would overwrite the date
+        shifted = conn.execute("UPDATE expenses SET date = date(date, printf('%+d days', ?)) "
+                               'WHERE id IN (SELECT id FROM temp.bulk_ids) AND date(date) = date', (int(days),)).rowcount
+        staged = conn.execute('SELECT COUNT(*) FROM expenses WHERE id IN (SELECT id FROM temp.bulk_ids)').fetchone()[0]
+    return names, staged - shifted
+
+
+def set_budget(name, monthly_budget):
+    """Set the user's monthly budget, in major units of the base currency."""
+    with transaction() as conn:
+        conn.execute('INSERT OR REPLACE INTO budgets (id, name, monthly_budget) VALUES ((SELECT id FROM budgets WHERE name=?), ?, ?)',
+                     (name, name, to_minor(monthly_budget, base_currency())))
+
+
+def get_budget(name):
+    """Return the user's monthly budget in the base currency, or None if none is set."""
+    row = get_connection().execute(f'SELECT {_budget_sql()} FROM budgets WHERE name=?', (name,)).fetchone()
+    return row[0] if row else None
+
+
+def spent_in_month(name, month):
+    """Total spent by `name` in `month` (YYYY-MM) in the base currency, read from monthly_totals."""
+    total, params = _base_total_sql('total')
+    return get_connection().execute(f"SELECT {total} FROM monthly_totals WHERE name=? AND month=?",
+                                    [*params, name, month]).fetchone()[0]
+
+
+def budget_status(name, month):
+    """Return (spent, budget) for `name` in `month` (YYYY-MM); budget is None if unset."""
+    return spent_in_month(name, month), get_budget(name)
+
+
+def budget_overview(month, user=''):
+    """Return (name, budget, spent) for every user with a budget, for `month` (YYYY-MM).
+    `user` restricts it to names containing that text."""
+    total, params = _base_total_sql('t.total', 't.currency')
+    return get_connection().execute(f'''SELECT b.name, {_budget_sql('b.monthly_budget')}, {total}
+                                       FROM budgets b LEFT JOIN monthly_totals t ON t.name = b.name AND t.month = ?
+                                       WHERE b.name LIKE ?
+                                       GROUP BY b.name ORDER BY b.name COLLATE NOCASE''', [*params, month, f'%{user}%']).fetchall()
+
+
+def _whole_months(date_from, date_to):
+    """True if the date range starts on a 1st and ends on a month end (or is open).
+    A bound that is not a YYYY-MM-DD date is never whole months."""
+    try:
+        first = _parse_date(date_from) if date_from else None
+        last = _parse_date(date_to) if date_to else None
+    except ValueError:
+        return False
+    if first and first.day != 1:
+        return False
+    return last is None or last.day == calendar.monthrange(last.year, last.month)[1]
+
+
+# group -> (monthly_totals column, equivalent expression over expenses);
+# monthly_totals keys undated rows and uncategorised ones by '' where expenses has NULL
+_TOTAL_GROUPS = {
+    'category': ("NULLIF(category, '')", 'category'),
+    'month': ("NULLIF(month, '')", 'substr(date, 1, 7)'),
+    'name': ('name', 'name'),
+}
+
+
+def grouped_totals(group, user='', category='', payment='', date_from='', date_to='', search=''):
+    """Return (key, total) pairs for the filtered expenses grouped by 'category', 'month' or 'name', sorted by key.
+    Totals are in the base currency.
+
+    Served from monthly_totals whenever the filters fit its granularity (no
+    payment or text filter, whole months); otherwise aggregated from expenses.
+    """
+    filters = _stripped(user, category, payment, date_from, date_to, search)
+    return _cached(('grouped', group, normalize_filters(*filters)), lambda: _grouped_totals(group, *filters))
+
+
+def _grouped_totals(group, user, category, payment, date_from, date_to, search):
+    summary_expr, expenses_expr = _TOTAL_GROUPS[group]
+    if not payment and not search and _whole_months(date_from, date_to):
+        where, params = "WHERE 1=1", []
+        if user:
+            where += " AND name LIKE ?"
+            params.append(f"%{user}%")
+        if category:
+            where += " AND category = ?"
+            params.append(category)
+        if date_from or date_to:
+            # like `date >= ?` on expenses, any date bound leaves out undated rows
+            where += " AND month != ''"
+        if date_from:
+            where += " AND month >= ?"
+            params.append(date_from[:7])
+        if date_to:
+            where += " AND month <= ?"
+            params.append(date_to[:7])
+        total, total_params = _base_total_sql('total')
+        sql = f"SELECT {summary_expr} AS k, {total} FROM monthly_totals {where} GROUP BY k ORDER BY k"
+    else:
+        where, params = filter_clause(user, category, payment, date_from, date_to, search)
+        total, total_params = _base_total_sql()
+        sql = f"SELECT {expenses_expr} AS k, {total} FROM expenses {where} GROUP BY k ORDER BY k"
+    return get_connection().execute(sql, [*total_params, *params]).fetchall()
+
+# --------------------- Utilities ---------------------
+
+CSV_HEADER = ['ID', 'Name', 'Amount', 'Category', 'Date', 'Notes', 'Payment Method', 'Location', 'Currency']
+CSV_BATCH_SIZE = 20000
 
 
-def restore_database():
-    src = filedialog.askopenfilename(filetypes=[('SQLite DB','*.db'),('All files','*.*')])
-    if not src:
+def _open_text(dest, mode, compress):
+    """Open a path or wrap a file object for CSV text I/O, gzip-(de)compressing if asked."""
+    if hasattr(dest, 'read' if mode == 'r' else 'write'):
+        if not compress:
+            return dest, False
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=dest, mode=mode + 'b'), encoding='utf-8', newline=''), True
+    if compress:
+        return gzip.open(dest, mode + 't', encoding='utf-8', newline=''), True
+    return open(dest, mode, newline='', encoding='utf-8'), True
+
+
+def write_expenses_csv(dest, compress=None, batch_size=CSV_BATCH_SIZE):
+    """Stream the expenses table to `dest` (a path or a text file object) as CSV.
+
+    Rows are fetched `batch_size` at a time so memory stays flat however big
+    the table is. compress=None gzips when the path ends in .gz. Returns the
+    number of rows written; nothing is written when the table is empty.
+    """
+    if compress is None:
+        compress = isinstance(dest, str) and dest.endswith('.gz')
+    cur = get_connection().execute(f"{_SELECT_EXPENSES} ORDER BY date ASC")
+    batch = cur.fetchmany(batch_size)
+    if not batch:
+        return 0
+    f, owned = _open_text(dest, 'w', compress)
+    count = 0
+    try:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        while batch:
+            writer.writerows(batch)
+            count += len(batch)
+            batch = cur.fetchmany(batch_size)
+    finally:
+        if owned:
+            f.close()
+        else:
+            f.flush()
+    return count
+
+
+# CSV header (lower-cased) -> expenses column. Accepts our own export format.
+_IMPORT_FIELDS = {
+    'name': 'name', 'amount': 'amount', 'category': 'category', 'date': 'date', 'notes': 'notes',
+    'payment method': 'payment_method', 'payment_method': 'payment_method', 'location': 'location',
+    'currency': 'currency',
+}
+_IMPORT_COLUMNS = ('name', 'amount', 'category', 'date', 'notes', 'payment_method', 'location')
+# shared by CSV import and recurring expenses; import_hash makes re-inserting a row a no-op
+_INSERT_KEYED = (f"INSERT OR IGNORE INTO expenses ({', '.join(_IMPORT_COLUMNS)}, currency, import_hash) "
+                 "VALUES (?,?,?,?,?,?,?,?,?)")
+
+
+# Date formats CSV import accepts besides ISO (YYYY-MM-DD, optionally followed
+# by a time), tried in order. Day-first, as on most bank statements.
+IMPORT_DATE_FORMATS = ('%d/%m/%Y', '%d.%m.%Y', '%d-%m-%Y', '%Y/%m/%d')
+
+
+def _normalize_date(text, formats=IMPORT_DATE_FORMATS):
+    """Return the date in `text` as YYYY-MM-DD, or None if it is not ISO or one of `formats`."""
+    if len(text) >= 10 and text[4] == '-' and text[7] == '-' and text[10:11] in ('', ' ', 'T'):
+        try:
+            return date.fromisoformat(text[:10]).isoformat()
+        except ValueError:
+            return None
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def _content_hash(values):
+    return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def import_expenses_csv(src, compress=None, batch_size=CSV_BATCH_SIZE, date_formats=IMPORT_DATE_FORMATS):
+    """Bulk-load expenses from a CSV path or text file object with a header row.
+
+    Columns are matched by header name (the ID column of an export is
+    ignored); Name and Amount are required. Amounts are in the row's
+    Currency, or the base currency without that column; rows in a currency
+    with no exchange rate count as invalid. Dates are stored as YYYY-MM-DD;
+    they may be ISO or in one of `date_formats`, and rows with any other
+    date count as invalid (a blank date is stored as none). Rows are parsed and inserted
+    `batch_size` at a time, one transaction per batch. Each row carries a hash
+    of its content and of how many identical rows came before it in the file,
+    so re-importing a file skips every row, while repeats within one file
+    (two identical bus fares on one day) are all kept.
+
+    Returns (inserted, duplicates, invalid) row counts.
+    """
+    if compress is None:
+        compress = isinstance(src, str) and src.endswith('.gz')
+    f, owned = _open_text(src, 'r', compress)
+    inserted = duplicates = invalid = 0
+    conn = get_connection()
+    base, rates = base_currency(), exchange_rates()
+
+    try:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return 0, 0, 0
+        index = {}
+        for i, title in enumerate(header):
+            column = _IMPORT_FIELDS.get(title.strip().lower())
+            if column and column not in index:
+                index[column] = i
+        if 'name' not in index or 'amount' not in index:
+            raise ValueError('CSV must have Name and Amount columns')
+        picks = [index.get(column) for column in _IMPORT_COLUMNS]
+        currency_at = index.get('currency')
+
+        batch = []
+        seen = {}   # content hash -> occurrences so far in this file
+        for row in reader:
+            values = [row[i].strip() if i is not None and i < len(row) else '' for i in picks]
+            currency = row[currency_at].strip().upper() if currency_at is not None and currency_at < len(row) else ''
+            currency = currency or base
+            try:
+                amount = to_minor(values[1], currency)
+            except ValueError:
+                amount = None
+            if values[3]:
+                values[3] = _normalize_date(values[3], date_formats)
+            if not values[0] or amount is None or currency not in rates or values[3] is None:
+                invalid += 1
+                continue
+            # base-currency rows hash as before currencies existed, so older imports still match
+            key = values if currency == base else values + [currency]
+            digest = _content_hash(key)
+            # the first occurrence keeps the plain content hash, so it matches older imports
+            occurrence = seen[digest] = seen.get(digest, 0) + 1
+            if occurrence > 1:
+                digest = _content_hash(key + [f'#{occurrence}'])
+            batch.append((values[0], amount, values[2], values[3] or None, *values[4:], currency, digest))
+            if len(batch) >= batch_size:
+                added = _insert_batch(conn, batch)
+                inserted += added
+                duplicates += len(batch) - added
+                batch = []
+        if batch:
+            added = _insert_batch(conn, batch)
+            inserted += added
+            duplicates += len(batch) - added
+    finally:
+        if owned:
+            f.close()
+    return inserted, duplicates, invalid
+
+
+def _insert_batch(conn, batch):
+    """Insert `batch` (rows for _INSERT_KEYED) in one transaction; return how many were actually inserted.
+
+    The per-row monthly_totals trigger is switched off for the batch and the
+    totals are folded in with one grouped upsert instead. The switch is only
+    ever set inside this transaction, so other connections never see it on.
+    """
+    with conn:
+        conn.execute('UPDATE totals_sync SET deferred = 1')
+        last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM expenses').fetchone()[0]
+        # rowcount sums sqlite3_changes(), which skips ignored rows and trigger writes
+        added = conn.executemany(_INSERT_KEYED, batch).rowcount
+        _add_to_monthly_totals(conn, last_id)
+        conn.execute('UPDATE totals_sync SET deferred = 0')
+    return added
+
+
+# --------------------- Recurring Expenses ---------------------
+# A rule is an RRULE subset: FREQ (cadence) plus INTERVAL, anchored on
+# start_date. Monthly and yearly occurrences keep the start day, clipped to
+# the end of shorter months (Jan 31 -> Feb 28 -> Mar 31).
+RECURRING_CADENCES = ('daily', 'weekly', 'monthly', 'yearly')
+_RULE_COLUMNS = ('name', 'amount', 'category', 'payment_method', 'notes', 'location', 'cadence', 'interval', 'start_date', 'end_date',
+                 'currency')
+
+
+def add_recurring_rule(name, amount, category, payment_method, notes, location, cadence, interval=1, start_date=None, end_date=None,
+                       currency=None):
+    """Create a rule and return its id. start_date defaults to today; currency to the base currency."""
+    if cadence not in RECURRING_CADENCES:
+        raise ValueError(f"cadence must be one of {', '.join(RECURRING_CADENCES)}")
+    if int(interval) < 1:
+        raise ValueError('interval must be at least 1')
+    start = _parse_date(start_date) if start_date else datetime.now().date()
+    end = _parse_date(end_date) if end_date else None
+    if end and end < start:
+        raise ValueError('end date is before start date')
+    currency = _known_currency(currency)
+    with transaction() as conn:
+        cur = conn.execute(f"INSERT INTO recurring_rules ({', '.join(_RULE_COLUMNS)}) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                           (name, to_minor(amount, currency), category, payment_method, notes, location, cadence, int(interval),
+                            start.isoformat(), end and end.isoformat(), currency))
+    return cur.lastrowid
+
+
+def list_recurring_rules():
+    """Return (id, name, amount, category, payment_method, notes, location, cadence, interval,
+    start_date, end_date, currency, materialized_through) for every rule; amount is major-unit text."""
+    columns = ', '.join(_AMOUNT_SQL if c == 'amount' else c for c in _RULE_COLUMNS)
+    return get_connection().execute(f"SELECT id, {columns}, materialized_through "
+                                    'FROM recurring_rules ORDER BY name COLLATE NOCASE, id').fetchall()
+
+
+def delete_recurring_rule(rule_id):
+    """Stop a rule. Expenses it already created are kept."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM recurring_rules WHERE id=?', (rule_id,))
+
+
+def _parse_date(text):
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def _add_months(day, months):
+    y, m = divmod(day.month - 1 + months, 12)
+    y, m = day.year + y, m + 1
+    return day.replace(year=y, month=m, day=min(day.day, calendar.monthrange(y, m)[1]))
+
+
+def _occurrences(cadence, interval, start, after, until):
+    """Yield the rule's occurrence dates in (after, until], in order.
+
+    Jumps straight to the first occurrence after `after` instead of walking
+    from the start date, so catching up a years-old rule costs only the new dates.
+    """
+    if cadence in ('daily', 'weekly'):
+        step = timedelta(days=interval * (7 if cadence == 'weekly' else 1))
+        n = (after - start).days // step.days + 1 if after >= start else 0
+        day = start + n * step
+        while day <= until:
+            yield day
+            day += step
         return
+    months = interval * (12 if cadence == 'yearly' else 1)
+    n = ((after.year - start.year) * 12 + after.month - start.month) // months if after >= start else 0
+    while True:
+        day = _add_months(start, n * months)
+        if day > until:
+            return
+        if day > after:
+            yield day
+        n += 1
+
+
+def materialize_recurring(today=None, batch_size=CSV_BATCH_SIZE):
+    """Insert every rule occurrence due up to `today` (default: today) that was not inserted yet.
+
+    Each rule remembers the date it was materialized through, so a run only
+    generates the occurrences since the last one; they are inserted in
+    batches through the same path as CSV imports. Every generated row also
+    carries a key unique to its rule and date in import_hash, so a run that
+    is interrupted and repeated never inserts an occurrence twice.
+
+    Returns the number of expenses inserted.
+    """
+    today = _parse_date(today) if isinstance(today, str) else today or datetime.now().date()
+    inserted, more = 0, True
+    while more:
+        added, more = materialize_recurring_batch(today, batch_size)
+        inserted += added
+    return inserted
+
+
+def materialize_recurring_batch(today=None, batch_size=CSV_BATCH_SIZE):
+    """Insert at most `batch_size` of the occurrences materialize_recurring() would.
+
+    Rules are advanced only as far as the rows inserted, so the next call
+    carries on where this one stopped. Returns (inserted, more), where more
+    says whether occurrences are still due.
+    """
+    today = _parse_date(today) if isinstance(today, str) else today or datetime.now().date()
+    conn = get_connection()
+    rules = conn.execute('SELECT id, name, amount, category, payment_method, notes, location, cadence, interval, '
+                         'start_date, end_date, currency, materialized_through FROM recurring_rules').fetchall()
+    batch, done, more = [], [], False
+    for rule_id, name, amount, category, payment, notes, location, cadence, interval, start, end, currency, through in rules:
+        start = _parse_date(start)
+        until = min(today, _parse_date(end)) if end else today
+        after = _parse_date(through) if through else start - timedelta(days=1)
+        if until <= after:
+            continue
+        last = None
+        for day in _occurrences(cadence, interval, start, after, until):
+            if len(batch) >= batch_size:
+                more = True
+                break
+            last = day.isoformat()
+            batch.append((name, amount, category, last, notes, payment, location, currency, f'recurring:{rule_id}:{last}'))
+        else:
+            done.append((until.isoformat(), rule_id))
+            continue
+        if last:    # the batch is full part way through this rule
+            done.append((last, rule_id))
+        break
+    inserted = _insert_batch(conn, batch) if batch else 0
+    if done:
+        with conn:
+            conn.executemany('UPDATE recurring_rules SET materialized_through=? WHERE id=?', done)
+    return inserted, more
+
+
+# --------------------- Backup / Restore ---------------------
+# Backups use the SQLite online backup API, which copies the live database a
+# few pages at a time so writers are only held off for one step at a time.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = 7
+
+
+def backup_to(dest, compress=None, pages=BACKUP_PAGES_PER_STEP, progress=None):
+    """Copy the live DB to `dest` while it stays in use.
+
+    progress(status, remaining, total) is called after every step of `pages`
+    pages. compress=None gzips when dest ends in .gz. The file only appears at
+    `dest` once the copy is complete.
+    """
+    if compress is None:
+        compress = dest.endswith('.gz')
+    tmp_db = dest + '.tmp'
+    try:
+        target = sqlite3.connect(tmp_db)
+        try:
+            get_connection().backup(target, pages=pages, progress=progress)
+        finally:
+            target.close()
+        if compress:
+            with open(tmp_db, 'rb') as fin, gzip.open(dest + '.tmp.gz', 'wb') as fout:
+                shutil.copyfileobj(fin, fout)
+            os.replace(dest + '.tmp.gz', dest)
+        else:
+            os.replace(tmp_db, dest)
+    finally:
+        for leftover in (tmp_db, dest + '.tmp.gz'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return dest
+
+
+def snapshot(directory=BACKUP_DIR, keep=BACKUP_KEEP, compress=True, pages=BACKUP_PAGES_PER_STEP, progress=None):
+    """Write a timestamped backup into `directory` and delete all but the newest `keep`."""
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(DB_FILE))[0]
+    name = f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db" + ('.gz' if compress else '')
+    path = backup_to(os.path.join(directory, name), compress=compress, pages=pages, progress=progress)
+    # timestamps sort lexically, so the oldest snapshots come first
+    existing = sorted(f for f in os.listdir(directory)
+                      if f.startswith(stem + '-') and (f.endswith('.db') or f.endswith('.db.gz')))
+    for old in existing[:-keep] if keep else []:
+        os.remove(os.path.join(directory, old))
+    return path
+
+
+def restore_from(src, pages=BACKUP_PAGES_PER_STEP, progress=None):
+    """Replace the live DB's contents with the backup at `src` (plain or .gz).
+
+    The copy goes through the pooled connection with the backup API, so every
+    connection sees the restored data straight away and no restart is needed.
+    Older backups are migrated to the current schema afterwards. Nothing is
+    copied unless `src` is intact and its expenses table has the columns of
+    its schema version, and that version is not newer than this app's.
+    """
+    if not os.path.exists(src):
+        raise FileNotFoundError(f'{src} does not exist')
+    path = src
     try:
-        shutil.copyfile(src, DB_FILE)
-        messagebox.showinfo('Restore', 'Database restored. Please restart the app to see changes.')
-    except Exception as e:
-        messagebox.showerror('Restore Error', str(e))
+        if src.endswith('.gz'):
+            fd, path = tempfile.mkstemp(suffix='.db')
+            with os.fdopen(fd, 'wb') as fout, gzip.open(src, 'rb') as fin:
+                try:
+                    shutil.copyfileobj(fin, fout)
+                except EOFError:
+                    raise ValueError(f'{src} is damaged') from None
+        source = sqlite3.connect(path)
+        try:
+            if source.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+                raise ValueError(f'{src} is damaged')
+            version = source.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise ValueError(f'{src} has schema version {version}, newer than this app ({SCHEMA_VERSION})')
+            columns = [row[1] for row in source.execute('PRAGMA table_info(expenses)')]
+            if columns != _expense_columns(version):
+                raise ValueError(f'{src} is not an expense tracker database')
+            source.backup(get_connection(), pages=pages, progress=progress)
+            # the backup API bypasses total_changes/data_version on this connection
+            _local.cache.clear()
+        finally:
+            source.close()
+    finally:
+        if path != src:
+            os.remove(path)
+    migrate()
@@ -0,0 +1,99 @@
+import tkinter as tk
+from tkinter import ttk
+
+import database
+
+
+class DiagnosticsWindow:
+    """Live view of the app's Profiler while it is open.
+
+    Lists every recorded operation with its count and timings, hottest (most
+    total time) first, and the most recent slow SQL statements; selecting one
+    shows its text and query plan. The query cache hit rate is shown on top.
+    """
+    REFRESH_MS = 1000
+    SLOW_SHOWN = 100
+
+    def __init__(self, app):
+        self.profiler = app.profiler
+        self.win = tk.Toplevel(app.root)
+        self.win.title('Diagnostics')
+        self.win.geometry('820x600')
+
+        self.header = ttk.Label(self.win, anchor='w', padding=6)
+        self.header.pack(fill='x')
+
+        ttk.Label(self.win, text='Operations (by total time)').pack(anchor='w', padx=6)
+        cols = ('kind', 'count', 'total', 'mean', 'max', 'last')
+        self.ops = ttk.Treeview(self.win, columns=cols, show='tree headings', height=10)
+        self.ops.heading('#0', text='Name')
+        self.ops.column('#0', width=200)
+        for col, title in zip(cols, ('Kind', 'Count', 'Total ms', 'Mean ms', 'Max ms', 'Last ms')):
+            self.ops.heading(col, text=title)
+            self.ops.column(col, width=90, anchor='e')
+        self.ops.pack(fill='both', expand=True, padx=6, pady=(0, 6))
+
+        ttk.Label(self.win, text='Slow SQL statements (newest first)').pack(anchor='w', padx=6)
+        self.slow = ttk.Treeview(self.win, columns=('ms', 'sql'), show='headings', height=8, selectmode='browse')
+        self.slow.heading('ms', text='ms')
+        self.slow.heading('sql', text='Statement')
+        self.slow.column('ms', width=80, anchor='e', stretch=False)
+        self.slow.column('sql', width=700, anchor='w')
+        self.slow.pack(fill='both', expand=True, padx=6)
+        self.slow.bind('<<TreeviewSelect>>', self._show_statement)
+
+        self.detail = tk.Text(self.win, height=7, wrap='word')
+        self.detail.pack(fill='x', padx=6, pady=6)
+
+        self._slow_records = []
+        self._job = None
+        self.win.protocol('WM_DELETE_WINDOW', self.close)
+        self.refresh()
+
+    @property
+    def is_open(self):
+        return self.win is not None and self.win.winfo_exists()
+
+    def lift(self):
+        self.win.deiconify()
+        self.win.lift()
+
+    def close(self):
+        if self._job is not None:
+            self.win.after_cancel(self._job)
+        self.win.destroy()
+        self.win = None
+
+    def refresh(self):
+        if not self.is_open:
+            return
+        stats = database.cache_stats()
+        text = (f"Query cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%})"
+                f'    Slow statement threshold: {self.profiler.slow_ms:g} ms')
+        if self.profiler.log_path:
+            text += f'    Log: {self.profiler.log_path}'
+        self.header.config(text=text)
+
+        self.ops.delete(*self.ops.get_children())
+        summary = sorted(self.profiler.summary().items(), key=lambda item: -item[1]['total_ms'])
+        for (kind, name), s in summary:
+            self.ops.insert('', 'end', text=name, values=(kind, s['count'], f"{s['total_ms']:.1f}",
+                                                          f"{s['total_ms'] / s['count']:.1f}",
+                                                          f"{s['max_ms']:.1f}", f"{s['last_ms']:.1f}"))
+
+        slow = [r for r in self.profiler.recent() if r['kind'] == 'slow_sql'][-self.SLOW_SHOWN:][::-1]
+        if slow != self._slow_records:
+            self._slow_records = slow
+            self.slow.delete(*self.slow.get_children())
+            for i, r in enumerate(slow):
+                self.slow.insert('', 'end', iid=str(i), values=(f"{r['ms']:.1f}", ' '.join(r['sql'].split())))
+        self._job = self.win.after(self.REFRESH_MS, self.refresh)
+
+    def _show_statement(self, event=None):
+        sel = self.slow.selection()
+        if not sel:
+            return
+        r = self._slow_records[int(sel[0])]
+        plan = '\n'.join(r['plan']) if r['plan'] else '(no plan available)'
+        self.detail.delete('1.0', 'end')
+        self.detail.insert('end', f"{r['sql']}\n\n{plan}")
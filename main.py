@@ -1,9 +1,23 @@
+import sys
+import time
+_START = time.perf_counter()
+
+from profiling import StartupTimer, Profiler
+timer = StartupTimer.from_argv(sys.argv[1:], start=_START) # pass --timings to print startup phase times
+profiler = Profiler.from_argv(sys.argv[1:]) # pass --profile[=FILE] for the diagnostics window / a JSON-lines log
+
 import tkinter as tk
 from ui import ExpenseTrackerApp
+import database
 from database import create_db
+if profiler.enabled:
+    database.CONNECT_HOOKS.append(profiler.attach)
+timer.mark('imports')
 
 if __name__ == '__main__':
     create_db()
+    timer.mark('create_db')
     root = tk.Tk()
-    app = ExpenseTrackerApp(root)
-    root.mainloop()
\ No newline at end of file
+    timer.mark('tk_init')
+    app = ExpenseTrackerApp(root, timer=timer, profiler=profiler)
+    root.mainloop()
@@ -0,0 +1,222 @@
+import sys
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Records how long each startup phase takes, up to the point the window is usable.
+
+    mark(phase) closes the phase that has been running since the previous mark
+    (or since `start`). finish() reports every phase once: to stderr, or as one
+    JSON line appended to `log_path` so runs can be compared across releases.
+    A disabled timer ignores all calls.
+    """
+
+    def __init__(self, enabled=False, log_path=None, start=None):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.start = start if start is not None else time.perf_counter()
+        self._last = self.start
+        self.phases = {}    # phase -> milliseconds, in the order they finished
+        self._finished = False
+
+    def mark(self, phase):
+        if not self.enabled or self._finished or phase in self.phases:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = (now - self._last) * 1000
+        self._last = now
+
+    def finish(self, phase='time_to_interactive'):
+        if not self.enabled or self._finished:
+            return
+        total = (time.perf_counter() - self.start) * 1000
+        self._finished = True
+        if self.log_path:
+            record = {'ts': time.time(), 'phases': self.phases, phase: total}
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        else:
+            for name, ms in self.phases.items():
+                print(f'startup {name:<20} {ms:8.1f} ms', file=sys.stderr)
+            print(f'startup {phase:<20} {total:8.1f} ms', file=sys.stderr)
+
+    @classmethod
+    def from_argv(cls, argv, start=None):
+        """--timings reports to stderr; --timings=FILE appends a JSON line to FILE."""
+        for arg in argv:
+            if arg == '--timings':
+                return cls(True, start=start)
+            if arg.startswith('--timings='):
+                return cls(True, log_path=arg.split('=', 1)[1], start=start)
+        return cls(False, start=start)
+
+
+class Span:
+    """A running timing span; end() records it. Created by Profiler.start()."""
+    __slots__ = ('profiler', 'name', 'fields', 'start')
+
+    def __init__(self, profiler, name, fields):
+        self.profiler = profiler
+        self.name = name
+        self.fields = fields
+        self.start = time.perf_counter()
+
+    def end(self, **fields):
+        ms = (time.perf_counter() - self.start) * 1000
+        self.profiler.record('span', self.name, ms, **self.fields, **fields)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def end(self, **fields):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """Opt-in instrumentation: timing spans and slow SQLite statements.
+
+    start(name) returns a span that is recorded when ended, which may be on
+    another thread or in a later callback (e.g. submitted on the Tk thread,
+    finished when the worker's result has been shown). attach(conn) adds a
+    trace callback and progress handler to a connection, so statements that
+    run longer than slow_ms are recorded with their query plan.
+
+    The newest `keep` records stay in memory for the diagnostics window; with
+    log_path each is also appended to that file as a JSON line. A disabled
+    profiler ignores all calls and costs next to nothing.
+    """
+    PROGRESS_OPS = 10000    # SQLite VM instructions between progress handler calls
+
+    def __init__(self, enabled=False, log_path=None, slow_ms=100, keep=1000):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.slow_ms = slow_ms
+        self.records = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._finishers = []    # per attached connection: records its open statement if slow
+
+    # --------------------- Spans ---------------------
+    def start(self, name, **fields):
+        return Span(self, name, fields) if self.enabled else NULL_SPAN
+
+    @contextmanager
+    def span(self, name, **fields):
+        s = self.start(name, **fields)
+        try:
+            yield s
+        finally:
+            s.end()
+
+    def traced(self, name, fn):
+        """Wrap fn so each call is recorded as a span (e.g. a job for the worker thread)."""
+        if not self.enabled:
+            return fn
+
+        def run(*args, **kwargs):
+            with self.span(name):
+                return fn(*args, **kwargs)
+        return run
+
+    def record(self, kind, name, ms, **fields):
+        if not self.enabled:
+            return
+        entry = {'ts': time.time(), 'kind': kind, 'name': name, 'ms': round(ms, 3),
+                 'thread': threading.current_thread().name, **fields}
+        self.records.append(entry)
+        if self.log_path:
+            with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def recent(self):
+        return list(self.records)   # copied in one step under the GIL, safe against appends from the worker
+
+    def summary(self):
+        """Return {(kind, name): {'count', 'total_ms', 'max_ms', 'last_ms'}} over the kept records."""
+        out = {}
+        for r in self.recent():
+            s = out.setdefault((r['kind'], r['name']), {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0})
+            s['count'] += 1
+            s['total_ms'] += r['ms']
+            s['max_ms'] = max(s['max_ms'], r['ms'])
+            s['last_ms'] = r['ms']
+        return out
+
+    # --------------------- SQLite ---------------------
+    def attach(self, conn):
+        """Record this connection's statements that take longer than slow_ms.
+
+        The trace callback marks when each statement starts and the progress
+        handler when it last did work; a statement is measured when the next
+        one starts, or on flush(). Nested programs (triggers, FTS internals, reported as
+        '-- ...') and repeats of the same text (the rows of an executemany)
+        count as part of the statement. The time includes any pauses
+        between fetches while the statement was open.
+        """
+        if not self.enabled:
+            return
+        path = conn.execute('PRAGMA database_list').fetchone()[2]
+        current = {'sql': None, 'start': 0.0, 'last': 0.0}
+
+        def finish():
+            ms = (current['last'] - current['start']) * 1000
+            if current['sql'] is not None and ms >= self.slow_ms:
+                self.record('slow_sql', current['sql'].split(None, 1)[0].upper(), ms,
+                            sql=current['sql'][:2000], plan=_query_plan(path, current['sql']))
+            current['sql'] = None
+
+        def trace(sql):
+            if sql == current['sql'] or sql.startswith('--'):
+                return
+            finish()
+            now = time.perf_counter()
+            current.update(sql=sql, start=now, last=now)
+
+        def progress():
+            current['last'] = time.perf_counter()
+            return 0
+
+        conn.set_trace_callback(trace)
+        conn.set_progress_handler(progress, self.PROGRESS_OPS)
+        self._finishers.append(finish)
+
+    def flush(self):
+        """Measure the last statement of every attached connection, e.g. before exiting.
+        Only call it while those connections are idle."""
+        for finish in self._finishers:
+            finish()
+
+    @classmethod
+    def from_argv(cls, argv):
+        """--profile keeps records for the diagnostics window; --profile=FILE also
+        appends them to FILE as JSON lines. --slow-ms=N sets the slow statement threshold."""
+        profiler = cls(False)
+        for arg in argv:
+            if arg == '--profile':
+                profiler.enabled = True
+            elif arg.startswith('--profile='):
+                profiler.enabled, profiler.log_path = True, arg.split('=', 1)[1]
+            elif arg.startswith('--slow-ms='):
+                profiler.slow_ms = float(arg.split('=', 1)[1])
+        return profiler
+
+
+def _query_plan(path, sql):
+    # a separate read-only connection: the traced one is mid-statement. Fails
+    # for in-memory databases and temp tables, which have no plan to show then.
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
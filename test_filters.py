@@ -0,0 +1,40 @@
+"""Checks that the filter bar finds the rows it should, through the query cache.
+
+Run with `python -m pytest`.
+"""
+import pytest
+
+import database
+
+NAMES = ('Émile Zola', 'Øyvind Berg', 'Anna  Lee', 'alice')
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_FILE', str(tmp_path / 'filters.db'))
+    database.create_db()
+    for i, name in enumerate(NAMES):
+        database.add_expense(name, f'{i + 1}.00', 'Food', f'2024-03-{i + 1:02d}', '', 'Card', '')
+    yield database.get_connection()
+    database.close_connections()
+
+
+@pytest.mark.parametrize('user, expected', [
+    ('Émile', ['Émile Zola']),
+    ('Øyvind', ['Øyvind Berg']),
+    ('  berg ', ['Øyvind Berg']),
+    ('Anna  Lee', ['Anna  Lee']),
+    ('ALICE', ['alice']),
+])
+def test_user_filter_matches_names_as_stored(db, user, expected):
+    assert database.count_expenses(user=user) == len(expected)
+    assert [row[1] for row in database.query_expenses_page(user=user)] == expected
+    assert [key for key, total in database.grouped_totals('name', user=user)] == expected
+
+
+def test_cache_key_does_not_fold_what_like_does_not(db):
+    # LIKE treats 'Ø' and 'ø' as different letters, so the cached answer for
+    # one must not be served for the other
+    assert database.count_expenses(user='Øyvind') == 1
+    assert database.count_expenses(user='øyvind') == 0
+    assert database.count_expenses(user='Anna Lee') == 0
@@ -0,0 +1,135 @@
+"""EXPLAIN QUERY PLAN checks for the queries the UI runs. Run with `python -m pytest`.
+
+Each test calls the public database function the UI calls, records the SQL it
+actually issues (through the connection's trace callback, which sees the
+statement with its parameters filled in) and asserts that every table it reads
+is reached through an index or primary key rather than a full table scan.
+
+Known exception: the user filter is `name LIKE '%text%'`, a substring match no
+index can seek on. SQLite then walks an index instead (idx_expenses_date for
+pages, so rows still come out in order; a covering index for counts), and
+test_user_filter_walks_an_index pins that behaviour down.
+"""
+import itertools
+
+import pytest
+
+import database
+
+# tables that are read in full by design, and why
+SMALL_TABLES = {
+    'exchange_rates',   # one row per currency
+    'sqlite_master',    # fts_available()
+}
+# a WITHOUT ROWID table is stored in its primary key, so SQLite reports an
+# in-order walk of that key as a plain SCAN
+WITHOUT_ROWID = {'monthly_totals'}
+INDEXED = ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY', 'USING PRIMARY KEY')
+
+FILTER_VALUES = {
+    'user': 'alice',
+    'category': 'Food',
+    'payment': 'Card',
+    'date_from': '2024-02-01',
+    'date_to': '2024-04-30',
+    'search': 'coffee',
+}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_FILE', str(tmp_path / 'plans.db'))
+    database.create_db()
+    for i in range(60):
+        database.add_expense(('Alice', 'Bob', 'Carol')[i % 3], f'{i + 1}.25', ('Food', 'Transport', 'Other')[i % 3],
+                             f'2024-{1 + i % 6:02d}-{1 + i % 28:02d}', ('coffee', 'train', 'gift')[i % 4 % 3],
+                             ('Card', 'Cash')[i % 2], 'Leeds')
+    database.set_budget('Alice', 100)
+    yield database.get_connection()
+    database.close_connections()
+
+
+def traced_selects(conn, fn):
+    """Run fn() uncached and return the SELECT statements it issued."""
+    statements = []
+    database.clear_query_cache()
+    conn.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        conn.set_trace_callback(None)
+    # lines starting with '--' are FTS5's own internal statements
+    return [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')]
+
+
+def plan_problems(conn, fn):
+    """Return the plan lines of fn()'s queries that read a table without an index."""
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    problems = []
+    selects = traced_selects(conn, fn)
+    assert selects, 'no query was traced'
+    for sql in selects:
+        for line in database.explain_query_plan(sql):
+            # SEARCH is always a seek (e.g. the MAX(id) lookup reports no index name)
+            words = line.split()
+            if words[0] != 'SCAN' or 'VIRTUAL TABLE' in line:
+                continue
+            # subqueries and aliases in the FROM clause are not tables
+            table = words[1]
+            if table not in tables or table in SMALL_TABLES or table in WITHOUT_ROWID:
+                continue
+            if not any(marker in line for marker in INDEXED):
+                problems.append(f'{line}  <-  {" ".join(sql.split())[:200]}')
+    return problems
+
+
+# every subset of the filter bar, from no filter to all six
+FILTER_COMBINATIONS = [pytest.param({name: FILTER_VALUES[name] for name in combo}, id='+'.join(combo) or 'none')
+                       for n in range(len(FILTER_VALUES) + 1)
+                       for combo in itertools.combinations(FILTER_VALUES, n)]
+
+
+@pytest.mark.parametrize('filters', FILTER_COMBINATIONS)
+def test_count_uses_index(db, filters):
+    assert plan_problems(db, lambda: database.count_expenses(**filters)) == []
+
+
+@pytest.mark.parametrize('filters', FILTER_COMBINATIONS)
+def test_first_page_uses_index(db, filters):
+    assert plan_problems(db, lambda: database.query_expenses_page(**filters, limit=5)) == []
+
+
+@pytest.mark.parametrize('filters', FILTER_COMBINATIONS)
+@pytest.mark.parametrize('after', [('2024-02-10', 7), (None, 7)], ids=['dated', 'undated'])
+def test_next_page_uses_index(db, filters, after):
+    assert plan_problems(db, lambda: database.query_expenses_page(**filters, after=after, limit=5)) == []
+
+
+def test_budget_status_uses_index(db):
+    assert plan_problems(db, lambda: database.budget_status('Alice', '2024-03')) == []
+
+
+def test_user_summaries_uses_index(db):
+    assert plan_problems(db, lambda: database.user_summaries('2024-03')) == []
+    assert plan_problems(db, lambda: database.user_summaries('2024-03', ['Alice', 'Bob'])) == []
+
+
+def test_user_filter_walks_an_index(db):
+    # the documented exception: LIKE '%alice%' cannot seek, so the page query
+    # walks the date index in order and tests each row's name
+    [sql] = [s for s in traced_selects(db, lambda: database.query_expenses_page(user='alice', limit=5))
+             if 'FROM expenses' in s]
+    plan = database.explain_query_plan(sql)
+    assert any(line.startswith('SCAN expenses USING INDEX idx_expenses_date') for line in plan), plan
+
+
+@pytest.mark.parametrize('after', [None, ('2024-02-10', 7), (None, 7)], ids=['first', 'dated', 'undated'])
+def test_search_walk_uses_index(db, after):
+    # the plan for searches matching a large share of the rows
+    walk = lambda: database._search_page_by_date('', 'Food', '', '', '', 'coffee', after, 5, chunk=8)
+    assert plan_problems(db, walk) == []
+    where, params = database.filter_clause('', 'Food', '', '', '', 'coffee')
+    key_sql, key_params = database._keyset_clause(after)
+    sorted_page = db.execute(f'{database._SELECT_EXPENSES} {where}{key_sql} ORDER BY date, id LIMIT 5',
+                             [*params, *key_params]).fetchall()
+    assert walk() == sorted_page
@@ -2,21 +2,28 @@
 # Install them using pip:
 # pip install tkcalendar matplotlib
 
+import bisect
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime, date
-import sqlite3 # Used in check_budget_alert
-from tkcalendar import DateEntry # Import DateEntry widget
-
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+# tkcalendar and matplotlib are slow to import, so they are imported where they
+# are first needed rather than here
 
 # Import functions from our new database module
-from . import database # Assuming ui.py and database.py are in the same directory
+import database # Assuming ui.py and database.py are in the same directory
+from worker import BackgroundExecutor
+from profiling import StartupTimer, Profiler
 
 class ExpenseTrackerApp:
-    def __init__(self, root):
+    PAGE_SIZE = 200       # rows fetched per Treeview page
+    RECURRING_BATCH = 2000  # recurring expenses added per worker job, about 0.15 s each
+    PREFETCH_AT = 0.9     # fetch the next page once the view is scrolled past this fraction
+    FILTER_DEBOUNCE_MS = 300  # live filtering waits this long after the last keystroke
+
+    def __init__(self, root, timer=None, profiler=None):
         self.root = root
+        self.timer = timer or StartupTimer()
+        self.profiler = profiler or Profiler() # spans for the diagnostics window; off unless --profile
         self.root.title('Expense Tracker')
         sw, sh = root.winfo_screenwidth(), root.winfo_screenheight()
         self.root.geometry(f'{int(sw*0.7)}x{int(sh*0.7)}')
@@ -25,9 +32,18 @@ class ExpenseTrackerApp:
         self.current_theme = 'clam'
         self.style.theme_use(self.current_theme)
 
+        self.chart_window = None
+        self.diagnostics_window = None
         self._build_ui()
-        database.create_db() # Use function from database module
+        self.timer.mark('_build_ui')
+        # all DB work runs on this executor's worker thread; results come back via root.after
+        self.executor = BackgroundExecutor(root, on_busy=self._set_busy, on_error=self._show_error)
+        self.executor.submit(database.create_db) # Use function from database module
         self.load_user_list()
+        # catch up recurring expenses behind the first user list load
+        self.catch_up_recurring()
+        # runs after the first paint, which is queued ahead of it
+        self.root.after_idle(self._build_date_filters)
 
     # --------------------- UI Build ---------------------
     def _build_ui(self):
@@ -38,6 +54,7 @@ class ExpenseTrackerApp:
         ttk.Label(top, text='Filter - User:').grid(row=0, column=0, sticky='w')
         self.filter_user = ttk.Entry(top, width=20)
         self.filter_user.grid(row=0, column=1, padx=4)
+        self.filter_user.bind('<Return>', lambda e: self.apply_filters())
 
         ttk.Label(top, text='Category:').grid(row=0, column=2, sticky='w')
         self.filter_category = ttk.Combobox(top, values=['', 'Food', 'Transport', 'Entertainment', 'Other'], state='readonly', width=15)
@@ -49,13 +66,23 @@ class ExpenseTrackerApp:
         self.filter_payment.grid(row=0, column=5, padx=4)
         self.filter_payment.set('')
 
-        ttk.Label(top, text='From:').grid(row=1, column=0, sticky='w', pady=6)
-        self.filter_from = DateEntry(top, width=12, background='darkblue', foreground='white', borderwidth=2, date_pattern='yyyy-mm-dd')
-        self.filter_from.grid(row=1, column=1, padx=4)
+        ttk.Label(top, text='Search:').grid(row=0, column=6, sticky='w')
+        self.filter_search = ttk.Entry(top, width=24) # full-text over name, notes and location
+        self.filter_search.grid(row=0, column=7, padx=4)
+        self.filter_search.bind('<Return>', lambda e: self.apply_filters())
+
+        # live filtering: typing or picking a value re-applies the filters once input pauses
+        self._filter_job = None
+        self.filter_user.bind('<KeyRelease>', self._schedule_filters)
+        self.filter_search.bind('<KeyRelease>', self._schedule_filters)
+        self.filter_category.bind('<<ComboboxSelected>>', self._schedule_filters)
+        self.filter_payment.bind('<<ComboboxSelected>>', self._schedule_filters)
 
+        ttk.Label(top, text='From:').grid(row=1, column=0, sticky='w', pady=6)
         ttk.Label(top, text='To:').grid(row=1, column=2, sticky='w')
-        self.filter_to = DateEntry(top, width=12, background='darkblue', foreground='white', borderwidth=2, date_pattern='yyyy-mm-dd')
-        self.filter_to.grid(row=1, column=3, padx=4)
+        # the DateEntry widgets are added by _build_date_filters once the window is up
+        self._filter_bar = top
+        self.filter_from = self.filter_to = None
 
         ttk.Button(top, text='Apply Filters', command=self.apply_filters).grid(row=1, column=4, padx=6)
         ttk.Button(top, text='Clear Filters', command=self.clear_filters).grid(row=1, column=5)
@@ -71,16 +98,25 @@ class ExpenseTrackerApp:
         left.pack(side='left', fill='y', padx=(0,8))
 
         ttk.Label(left, text='Users').pack(anchor='w')
-        self.user_canvas = tk.Canvas(left, width=200, height=400)
-        self.user_frame = ttk.Frame(self.user_canvas)
-        vsb = ttk.Scrollbar(left, orient='vertical', command=self.user_canvas.yview)
-        self.user_canvas.configure(yscrollcommand=vsb.set)
+        # one Treeview row per user (Tk only draws the visible rows); the iid is the user name
+        users_box = ttk.Frame(left)
+        users_box.pack(fill='y', expand=True)
+        self.user_list = ttk.Treeview(users_box, columns=('spent', 'budget'), show='tree headings', height=18, selectmode='browse')
+        self.user_list.heading('#0', text='Name')
+        self.user_list.heading('spent', text='This Month')
+        self.user_list.heading('budget', text='Budget')
+        self.user_list.column('#0', width=110)
+        self.user_list.column('spent', width=80, anchor='e')
+        self.user_list.column('budget', width=80, anchor='e')
+        self.user_list.tag_configure('over', foreground='red')
+        vsb = ttk.Scrollbar(users_box, orient='vertical', command=self.user_list.yview)
+        self.user_list.configure(yscrollcommand=vsb.set)
         vsb.pack(side='right', fill='y')
-        self.user_canvas.pack(side='left')
-        self.user_canvas.create_window((0,0), window=self.user_frame, anchor='nw')
-        self.user_frame.bind('<Configure>', lambda e: self.user_canvas.configure(scrollregion=self.user_canvas.bbox('all')))
+        self.user_list.pack(side='left', fill='y')
+        self.user_list.bind('<<TreeviewSelect>>', self._on_user_selected)
 
         ttk.Button(left, text='Add Budget / Set', command=self.open_budget_window).pack(pady=6, fill='x')
+        ttk.Button(left, text='Recurring Expenses', command=self.open_recurring_window).pack(fill='x')
 
         # Right panel: expenses table and controls
         right = ttk.Frame(mid)
@@ -91,14 +127,18 @@ class ExpenseTrackerApp:
         ttk.Button(controls, text='Add Expense', command=self.open_add_window).pack(side='left', padx=4)
         ttk.Button(controls, text='Edit Selected', command=self.open_edit_selected).pack(side='left', padx=4)
         ttk.Button(controls, text='Delete Selected', command=self.delete_selected).pack(side='left', padx=4)
-        ttk.Button(controls, text='Export CSV', command=lambda: database.export_db_to_csv()).pack(side='left', padx=4) # Use function from database module
-        ttk.Button(controls, text='Backup DB', command=database.backup_database).pack(side='left', padx=4) # Use function from database module
-        ttk.Button(controls, text='Restore DB', command=database.restore_database).pack(side='left', padx=4) # Use function from database module
-        ttk.Button(controls, text='Show Category Chart', command=self.show_category_chart).pack(side='left', padx=4)
+        ttk.Button(controls, text='Bulk Edit', command=self.open_bulk_window).pack(side='left', padx=4)
+        ttk.Button(controls, text='Export CSV', command=self.export_csv).pack(side='left', padx=4)
+        ttk.Button(controls, text='Import CSV', command=self.import_csv).pack(side='left', padx=4)
+        ttk.Button(controls, text='Backup DB', command=self.backup_db).pack(side='left', padx=4)
+        ttk.Button(controls, text='Restore DB', command=self.restore_db).pack(side='left', padx=4)
+        ttk.Button(controls, text='Show Charts', command=self.show_charts).pack(side='left', padx=4)
         ttk.Button(controls, text='Toggle Theme', command=self.toggle_theme).pack(side='right', padx=4)
+        if self.profiler.enabled:
+            ttk.Button(controls, text='Diagnostics', command=self.show_diagnostics).pack(side='right', padx=4)
 
         # Treeview for expenses
-        cols = ('id','name','amount','category','date','notes','payment_method','location')
+        cols = ('id','name','amount','category','date','notes','payment_method','location','currency')
         self.tree = ttk.Treeview(right, columns=cols, show='headings')
         for col in cols:
             self.tree.heading(col, text=col.title())
@@ -106,34 +146,116 @@ class ExpenseTrackerApp:
         self.tree.pack(side='left', fill='both', expand=True)
 
         # scrollbars
-        ysb = ttk.Scrollbar(right, orient='vertical', command=self.tree.yview)
+        self.tree_ysb = ttk.Scrollbar(right, orient='vertical', command=self.tree.yview)
         xsb = ttk.Scrollbar(right, orient='horizontal', command=self.tree.xview)
-        self.tree.configure(yscroll=ysb.set, xscroll=xsb.set)
-        ysb.pack(side='right', fill='y')
+        self.tree.configure(yscroll=self._on_tree_scroll, xscroll=xsb.set)
+        self.tree_ysb.pack(side='right', fill='y')
         xsb.pack(side='bottom', fill='x')
 
+        # Paging state: rows are fetched lazily PAGE_SIZE at a time while scrolling
+        self._filters = ('', '', '', '', '', '')
+
+        # writes queue one coalesced refresh (see refresh_after_write)
+        self._refresh_scheduled = False
+        self._refresh_names = set()
+        self._page_after = None
+        self._has_more = False
+        self._page_pending = False
+        self._total = 0
+
         # Bind double click to edit
         self.tree.bind('<Double-1>', lambda e: self.open_edit_selected())
+        # select every loaded row, e.g. for bulk edits
+        self.tree.bind('<Control-a>', lambda e: self.tree.selection_set(self.tree.get_children()))
 
         # Status bar
         self.status = ttk.Label(self.root, text='Ready', relief='sunken', anchor='w')
         self.status.pack(fill='x', side='bottom')
+        self.busy_bar = ttk.Progressbar(self.status, mode='indeterminate', length=80)
+        self._busy_shown = False
 
-    # --------------------- User + List Management ---------------------
-    def load_user_list(self):
-        # Clear current
-        for w in self.user_frame.winfo_children():
-            w.destroy()
+    def _build_date_filters(self):
+        from tkcalendar import DateEntry
+        self.filter_from = DateEntry(self._filter_bar, width=12, background='darkblue', foreground='white', borderwidth=2, date_pattern='yyyy-mm-dd')
+        self.filter_from.grid(row=1, column=1, padx=4)
+        self.filter_to = DateEntry(self._filter_bar, width=12, background='darkblue', foreground='white', borderwidth=2, date_pattern='yyyy-mm-dd')
+        self.filter_to.grid(row=1, column=3, padx=4)
+        self.filter_from.bind('<<DateEntrySelected>>', self._schedule_filters)
+        self.filter_to.bind('<<DateEntrySelected>>', self._schedule_filters)
+        self._startup_step('date_filters')
+
+    def _startup_step(self, phase):
+        # the window is interactive once both deferred startup steps are done
+        self.timer.mark(phase)
+        if {'load_user_list', 'date_filters'} <= self.timer.phases.keys():
+            self.timer.finish()
+
+    def _set_busy(self, pending):
+        if pending and not self._busy_shown:
+            self.busy_bar.pack(side='right', padx=4)
+            self.busy_bar.start(15)
+            self.status.config(cursor='watch')
+        elif not pending and self._busy_shown:
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+            self.status.config(cursor='')
+        self._busy_shown = bool(pending)
+
+    def _show_error(self, error):
+        messagebox.showerror('Error', str(error))
 
-        with sqlite3.connect(database.DB_FILE) as conn: # Use DB_FILE from database module
-            c = conn.cursor()
-            c.execute("SELECT DISTINCT name FROM expenses ORDER BY name COLLATE NOCASE ASC")
-            users = [r[0] for r in c.fetchall()]
+    # --------------------- User + List Management ---------------------
+    USER_REFRESH_LIMIT = 500  # more changed names than this and the whole list is reloaded
 
-        # show unique once
-        for name in users:
-            b = ttk.Button(self.user_frame, text=name, width=25, command=lambda n=name: self.show_user(n))
-            b.pack(pady=2)
+    def load_user_list(self):
+        month = date.today().strftime('%Y-%m')
+        span = self.profiler.start('load_user_list')
+        self.executor.submit(self.profiler.traced('load_user_list.query', database.user_summaries), month,
+                             on_done=lambda rows: self._show_user_list(rows, span), key='users')
+
+    def refresh_users(self, names):
+        """Update only the sidebar rows for `names`: add, change or drop them as their data now says."""
+        names = {str(n) for n in names}
+        if len(names) > self.USER_REFRESH_LIMIT:
+            self.load_user_list()
+            return
+        month = date.today().strftime('%Y-%m')
+        self.executor.submit(database.user_summaries, month, names, on_done=lambda rows: self._update_users(names, rows))
+
+    def _show_user_list(self, rows, span):
+        with self.profiler.span('load_user_list.treeview', rows=len(rows)):
+            self.user_list.delete(*self.user_list.get_children())
+            for row in rows:
+                self._put_user(row, 'end')
+        span.end(users=len(rows))
+        self._startup_step('load_user_list')
+
+    def _update_users(self, names, rows):
+        found = {row[0] for row in rows}
+        for name in names - found:
+            if self.user_list.exists(name):
+                self.user_list.delete(name)
+        for row in rows:
+            if self.user_list.exists(row[0]):
+                self._put_user(row)
+            else:
+                # keep the list in the same case-insensitive order the full load uses
+                keys = [iid.casefold() for iid in self.user_list.get_children()]
+                self._put_user(row, bisect.bisect(keys, row[0].casefold()))
+
+    def _put_user(self, row, index=None):
+        name, spent, budget = row
+        values = (f'{spent:.2f}', f'{budget:.2f}' if budget else '')
+        tags = ('over',) if budget and spent > budget else ()
+        if index is None:
+            self.user_list.item(name, values=values, tags=tags)
+        else:
+            self.user_list.insert('', index, iid=name, text=name, values=values, tags=tags)
+
+    def _on_user_selected(self, event=None):
+        sel = self.user_list.selection()
+        if sel:
+            self.show_user(sel[0])
 
     def show_user(self, name):
         self.filter_user.delete(0, 'end')
@@ -141,54 +263,91 @@ class ExpenseTrackerApp:
         self.apply_filters()
 
     # --------------------- Filters ---------------------
-    def apply_filters(self):
+    def current_filters(self):
+        """Return the filter bar as a (user, category, payment, date_from, date_to, search) tuple."""
         user = self.filter_user.get().strip()
         category = self.filter_category.get().strip()
         payment = self.filter_payment.get().strip()
-        ffrom = self.filter_from.get_date().strftime('%Y-%m-%d') if self.filter_from.get_date() else ''
-        fto = self.filter_to.get_date().strftime('%Y-%m-%d') if self.filter_to.get_date() else ''
-
-        query = "SELECT * FROM expenses WHERE 1=1"
-        params = []
-        if user:
-            query += " AND name LIKE ?"
-            params.append(f"%{user}%")
-        if category:
-            query += " AND category = ?"
-            params.append(category)
-        if payment:
-            query += " AND payment_method = ?"
-            params.append(payment)
-        if ffrom:
-            query += " AND date >= ?"
-            params.append(ffrom)
-        if fto:
-            query += " AND date <= ?"
-            params.append(fto)
-
-        query += " ORDER BY date ASC"
-        with sqlite3.connect(database.DB_FILE) as conn: # Use DB_FILE from database module
-            c = conn.cursor()
-            c.execute(query, params)
-            rows = c.fetchall()
-
-        # populate tree
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        ffrom = self.filter_from.get_date().strftime('%Y-%m-%d') if self.filter_from and self.filter_from.get_date() else ''
+        fto = self.filter_to.get_date().strftime('%Y-%m-%d') if self.filter_to and self.filter_to.get_date() else ''
+        search = self.filter_search.get().strip()
+        return user, category, payment, ffrom, fto, search
+
+    def _schedule_filters(self, event=None):
+        if event is not None and event.keysym == 'Return':
+            return # Enter applies straight away
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(self.FILTER_DEBOUNCE_MS, lambda: self.apply_filters(live=True))
+
+    def apply_filters(self, live=False):
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+            self._filter_job = None
+        # load only the first page; the rest comes in on scroll. A newer filter
+        # change supersedes this one (same key) so stale results never land.
+        # Repeated filters (same user clicked twice, cleared filters) are served
+        # from database's query cache until something is written.
+        self._filters = self.current_filters()
+        user = self._filters[0]
+        self._has_more = False
+        self._page_pending = False
+        span = self.profiler.start('apply_filters', live=live)
+        self.executor.submit(self.profiler.traced('apply_filters.query', self._fetch_first_page), self._filters,
+                             on_done=lambda result: self._show_first_page(result, span), key='tree')
+        # an open chart window follows explicit applies and writes (see _run_refresh);
+        # its aggregates can take a second on a large database, too slow for every pause in typing
+        if not live:
+            self._refresh_chart()
+
+        # check budget warnings for current user filter; not while typing, as a
+        # half-typed name could pop up warnings for someone else
+        if user and not live:
+            self.check_budget_alert(user)
+
+    def _fetch_first_page(self, filters):
+        # runs on the worker thread
+        return database.count_expenses(*filters), database.query_expenses_page(*filters, limit=self.PAGE_SIZE)
+
+    def _show_first_page(self, result, span):
+        self._total, rows = result
+        self._page_after = None
+        with self.profiler.span('apply_filters.treeview', rows=len(rows)):
+            self.tree.delete(*self.tree.get_children())
+            self._append_page(rows)
+        span.end(total=self._total)
+
+    def _load_next_page(self):
+        if not self._has_more:
+            self._page_pending = False
+            return
+        filters, after = self._filters, self._page_after
+        self.executor.submit(lambda: database.query_expenses_page(*filters, after=after, limit=self.PAGE_SIZE),
+                             on_done=self._append_page, key='tree')
+
+    def _append_page(self, rows):
+        self._page_pending = False
         for r in rows:
             self.tree.insert('', 'end', values=r)
+        self._has_more = len(rows) == self.PAGE_SIZE
+        if rows:
+            self._page_after = (rows[-1][4], rows[-1][0])  # (date, id) keyset of the last row
+        self.status.config(text=f'Showing {len(self.tree.get_children())} of {self._total} record(s)')
 
-        self.status.config(text=f'Showing {len(rows)} record(s)')
-        # check budget warnings for current user filter
-        if user:
-            self.check_budget_alert(user)
+    def _on_tree_scroll(self, first, last):
+        self.tree_ysb.set(first, last)
+        if self._has_more and not self._page_pending and float(last) >= self.PREFETCH_AT:
+            self._page_pending = True
+            self.root.after_idle(self._load_next_page)
 
     def clear_filters(self):
         self.filter_user.delete(0,'end')
+        self.filter_search.delete(0,'end')
         self.filter_category.set('')
         self.filter_payment.set('')
-        self.filter_from.set_date('')
-        self.filter_to.set_date('')
+        if self.filter_from:
+            self.filter_from.set_date('')
+            self.filter_to.set_date('')
         self.apply_filters()
 
     # --------------------- Add / Edit / Delete ---------------------
@@ -204,12 +363,13 @@ class ExpenseTrackerApp:
         self._open_expense_window(mode='edit', data=item)
 
     def _open_expense_window(self, mode='add', data=None):
+        from tkcalendar import DateEntry
         win = tk.Toplevel(self.root)
         win.title('Add Expense' if mode=='add' else 'Edit Expense')
-        win.geometry('400x450')
+        win.geometry('400x500')
 
         fields = {}
-        labels = [('Name','name'),('Amount','amount'),('Date (YYYY-MM-DD)','date'),('Category','category'),('Payment Method','payment'),('Location','location'),('Notes','notes')]
+        labels = [('Name','name'),('Amount','amount'),('Currency (blank = base currency)','currency'),('Date (YYYY-MM-DD)','date'),('Category','category'),('Payment Method','payment'),('Location','location'),('Notes','notes')]
         for lab, key in labels:
             ttk.Label(win, text=lab).pack(anchor='w', padx=8, pady=(8,2))
             if key == 'category':
@@ -218,6 +378,10 @@ class ExpenseTrackerApp:
             elif key == 'payment':
                 fields[key] = ttk.Combobox(win, values=['Cash','Card','Online'], state='readonly')
                 fields[key].set('Cash')
+            elif key == 'currency':
+                # any currency with an exchange rate; the list is filled in once read
+                fields[key] = ttk.Combobox(win)
+                self.executor.submit(database.exchange_rates, on_done=lambda rates: fields['currency'].config(values=sorted(rates)))
             elif key == 'date': # New condition for DateEntry
                 fields[key] = DateEntry(win, width=18, background='darkblue', foreground='white', borderwidth=2, date_pattern='yyyy-mm-dd')
                 fields[key].set_date(datetime.now()) # Set default to today
@@ -227,7 +391,7 @@ class ExpenseTrackerApp:
 
         # prefill for edit
         if mode=='edit' and data:
-            # data order: id,name,amount,category,date,notes,payment_method,location
+            # data order: id,name,amount,category,date,notes,payment_method,location,currency
             fields['name'].insert(0, data[1])
             fields['amount'].insert(0, str(data[2]))
             fields['category'].set(data[3])
@@ -235,6 +399,7 @@ class ExpenseTrackerApp:
             fields['notes'].insert(0, data[5] or '')
             fields['payment'].set(data[6] or 'Cash')
             fields['location'].insert(0, data[7] or '')
+            fields['currency'].set(data[8])
 
         def save():
             name = fields['name'].get().strip()
@@ -244,6 +409,7 @@ class ExpenseTrackerApp:
             dat = fields['date'].get_date().strftime('%Y-%m-%d') # Get date from DateEntry and format
             loc = fields['location'].get().strip()
             notes = fields['notes'].get().strip()
+            cur = fields['currency'].get().strip() or None
 
             # validations
             if not name:
@@ -257,23 +423,21 @@ class ExpenseTrackerApp:
                 messagebox.showerror('Validation', 'Amount must be a positive number')
                 return
 
-            with sqlite3.connect(database.DB_FILE) as conn: # Use DB_FILE from database module
-                c = conn.cursor()
-                if mode=='add':
-                    c.execute('''INSERT INTO expenses (name, amount, category, date, notes, payment_method, location)\
-                                 VALUES (?,?,?,?,?,?,?)''', (name, amt, cat, dat, notes, pay, loc))\
-                else:
-                    rec_id = data[0]
-                    c.execute('''UPDATE expenses SET name=?, amount=?, category=?, date=?, notes=?, payment_method=?, location=? WHERE id=?''',\
-                              (name, amt, cat, dat, notes, pay, loc, rec_id))
-                conn.commit()
-
-            win.destroy()\
-            self.load_user_list()\
-            self.apply_filters()\
-            messagebox.showinfo('Saved', 'Record saved successfully')\
-            # check budget for this user\
-            self.check_budget_alert(name)
+            span = self.profiler.start('save', mode=mode)
+
+            def saved(_):
+                span.end()
+                win.destroy()
+                self.refresh_after_write({name, data[1]} if mode=='edit' else {name})
+                messagebox.showinfo('Saved', 'Record saved successfully')
+                # check budget for this user
+                self.check_budget_alert(name)
+
+            # the amount goes to the database as typed, so it is converted to minor units exactly
+            if mode=='add':
+                self.executor.submit(database.add_expense, name, amt_s, cat, dat, notes, pay, loc, cur, on_done=saved)
+            else:
+                self.executor.submit(database.update_expense, data[0], name, amt_s, cat, dat, notes, pay, loc, cur, on_done=saved)
 
         ttk.Button(win, text='Save', command=save).pack(pady=12)
 
@@ -285,13 +449,149 @@ class ExpenseTrackerApp:
         if not messagebox.askyesno('Confirm', 'Delete selected record(s)?'):
             return
         ids = [self.tree.item(s)['values'][0] for s in sel]
-        with sqlite3.connect(database.DB_FILE) as conn: # Use DB_FILE from database module
-            c = conn.cursor()
-            c.executemany('DELETE FROM expenses WHERE id=?', [(i,) for i in ids])
-            conn.commit()
-        self.apply_filters()
-        self.load_user_list()
-        messagebox.showinfo('Deleted', f'Deleted {len(ids)} record(s)')
+
+        span = self.profiler.start('delete', rows=len(ids))
+
+        def deleted(names):
+            span.end()
+            self.refresh_after_write(names)
+            messagebox.showinfo('Deleted', f'Deleted {len(ids)} record(s)')
+        self.executor.submit(database.delete_expenses, ids, on_done=deleted)
+
+    def open_bulk_window(self):
+        sel = self.tree.selection()
+        if not sel:
+            messagebox.showwarning('Bulk Edit', 'Select one or more records first (Ctrl+A selects all loaded rows)')
+            return
+        ids = [self.tree.item(s)['values'][0] for s in sel]
+
+        win = tk.Toplevel(self.root)
+        win.title(f'Bulk Edit ({len(ids)} records)')
+        win.geometry('320x330')
+
+        action = tk.StringVar(value='category')
+        ttk.Radiobutton(win, text='Set category', variable=action, value='category').pack(anchor='w', padx=8, pady=(8,2))
+        cat = ttk.Combobox(win, values=['Food','Transport','Entertainment','Other'], state='readonly')
+        cat.set('Other')
+        cat.pack(fill='x', padx=24)
+        ttk.Radiobutton(win, text='Set payment method', variable=action, value='payment').pack(anchor='w', padx=8, pady=(8,2))
+        pay = ttk.Combobox(win, values=['Cash','Card','Online'], state='readonly')
+        pay.set('Cash')
+        pay.pack(fill='x', padx=24)
+        ttk.Radiobutton(win, text='Shift dates by (days)', variable=action, value='shift').pack(anchor='w', padx=8, pady=(8,2))
+        days = ttk.Spinbox(win, from_=-3650, to=3650, increment=1)
+        days.set(0)
+        days.pack(fill='x', padx=24)
+        ttk.Radiobutton(win, text='Delete', variable=action, value='delete').pack(anchor='w', padx=8, pady=(8,2))
+
+        def apply():
+            a = action.get()
+            if a == 'category':
+                job = (database.bulk_update, ids, cat.get(), None)
+            elif a == 'payment':
+                job = (database.bulk_update, ids, None, pay.get())
+            elif a == 'shift':
+                try:
+                    n = int(days.get())
+                    if n == 0:
+                        raise ValueError
+                except ValueError:
+                    messagebox.showerror('Validation', 'Days must be a non-zero whole number', parent=win)
+                    return
+                job = (database.shift_dates, ids, n)
+            else:
+                if not messagebox.askyesno('Confirm', f'Delete {len(ids)} record(s)?', parent=win):
+                    return
+                job = (database.delete_expenses, ids)
+
+            span = self.profiler.start('bulk_edit', action=a, rows=len(ids))
+
+            def done(result):
+                # one transaction in the worker, one refresh here
+                names, skipped = result if a == 'shift' else (result, 0)
+                span.end()
+                win.destroy()
+                self.refresh_after_write(names)
+                message = f'Updated {len(ids) - skipped} record(s)'
+                if skipped:
+                    message += f'; {skipped} without a YYYY-MM-DD date were left unchanged'
+                messagebox.showinfo('Bulk Edit', message)
+            self.executor.submit(*job, on_done=done)
+
+        ttk.Button(win, text='Apply', command=apply).pack(pady=12)
+
+    def refresh_after_write(self, names=None):
+        """Queue one refresh of the expense list, chart and sidebar after a write.
+
+        Calls made before the refresh runs are merged into it. `names` are the
+        users whose sidebar rows changed; None reloads the whole sidebar.
+        """
+        if names is None:
+            self._refresh_names = None
+        elif self._refresh_names is not None:
+            self._refresh_names |= {str(n) for n in names}
+        if not self._refresh_scheduled:
+            self._refresh_scheduled = True
+            self.root.after_idle(self._run_refresh)
+
+    def _run_refresh(self):
+        names, self._refresh_names = self._refresh_names, set()
+        self._refresh_scheduled = False
+        self.apply_filters(live=True) # no budget popup; callers check the users they changed
+        self._refresh_chart()
+        if names is None:
+            self.load_user_list()
+        elif names:
+            self.refresh_users(names)
+
+    def export_csv(self):
+        path = database.CSV_FILE
+
+        def exported(count):
+            if not count:
+                messagebox.showinfo('Export', 'No data to export')
+            else:
+                messagebox.showinfo('Export', f'Exported {count} rows to {path}')
+        self.executor.submit(database.write_expenses_csv, path, on_done=exported)
+
+    def import_csv(self):
+        src = filedialog.askopenfilename(filetypes=[('CSV files', '*.csv *.csv.gz'), ('All files', '*.*')])
+        if not src:
+            return
+
+        def imported(result):
+            inserted, duplicates, invalid = result
+            self.refresh_after_write()
+            messagebox.showinfo('Import', f'Imported {inserted} row(s); skipped {duplicates} duplicate(s) and {invalid} invalid row(s)')
+        self.executor.submit(database.import_expenses_csv, src, on_done=imported)
+
+    # --------------------- Backup / Restore ---------------------
+    def _page_progress(self, label):
+        # the backup API calls this on the worker thread; hand the update to Tk
+        def progress(status, remaining, total):
+            self.executor.post(lambda: self.status.config(text=f'{label}: {total - remaining}/{total} pages'))
+        return progress
+
+    def backup_db(self):
+        dest = filedialog.asksaveasfilename(defaultextension='.db', filetypes=[('SQLite DB','*.db'),('Compressed SQLite DB','*.db.gz'),('All files','*.*')])
+        if not dest:
+            return
+        self.executor.submit(database.backup_to, dest, None, database.BACKUP_PAGES_PER_STEP, self._page_progress('Backing up'),
+                             on_done=lambda _: messagebox.showinfo('Backup', f'Database backed up to {dest}'),
+                             on_error=lambda e: messagebox.showerror('Backup Error', str(e)))
+
+    def restore_db(self):
+        src = filedialog.askopenfilename(filetypes=[('SQLite DB','*.db *.db.gz'),('All files','*.*')])
+        if not src:
+            return
+        if not messagebox.askyesno('Restore', 'Replace all current data with this backup?'):
+            return
+
+        def restored(_):
+            self.refresh_after_write()
+            messagebox.showinfo('Restore', 'Database restored')
+        self.executor.submit(database.restore_from, src, database.BACKUP_PAGES_PER_STEP, self._page_progress('Restoring'),
+                             on_done=restored, on_error=lambda e: messagebox.showerror('Restore Error', str(e)))
 
     # --------------------- Budget ---------------------
     def open_budget_window(self):
@@ -319,32 +619,127 @@ class ExpenseTrackerApp:
             if not n:
                 messagebox.showerror('Validation', 'User name required')
                 return
-            with sqlite3.connect(database.DB_FILE) as conn: # Use DB_FILE from database module
-                c = conn.cursor()
-                c.execute('INSERT OR REPLACE INTO budgets (id, name, monthly_budget) VALUES ((SELECT id FROM budgets WHERE name=?), ?, ?)', (n, n, b))
-                conn.commit()
-            messagebox.showinfo('Saved', 'Budget saved')
-            win.destroy()
+
+            def saved(_):
+                self.refresh_users([n])
+                messagebox.showinfo('Saved', 'Budget saved')
+                win.destroy()
+            self.executor.submit(database.set_budget, n, b, on_done=saved)
 
         ttk.Button(win, text='Save Budget', command=save_budget).pack(pady=12)
 
     def check_budget_alert(self, name):
-        # calculate current month's spending for the user
+        # current month's spending for the user, from the maintained monthly totals
+        month = date.today().strftime('%Y-%m')
+
+        def show(result):
+            total, budget = result
+            if budget is not None and budget > 0:
+                if total > budget:
+                    messagebox.showwarning('Budget Exceeded', f"{name} has spent {total:.2f} this month which exceeds budget {budget:.2f}")
+                else:
+                    self.status.config(text=f"{name} spent {total:.2f} of {budget:.2f} this month")
+        self.executor.submit(database.budget_status, name, month, on_done=show, key='budget')
+
+    # --------------------- Recurring ---------------------
+    def catch_up_recurring(self):
+        """Add the recurring expenses that are due, one batch per worker job.
+
+        Each batch queues the next only when it is done, so filtering, paging and
+        saves submitted meanwhile run in between instead of waiting for years of
+        daily rules to be caught up.
+        """
         today = date.today()
-        first = today.replace(day=1).strftime('%Y-%m-%d')
-        last = today.strftime('%Y-%m-%d')
-        with sqlite3.connect(database.DB_FILE) as conn: # Use DB_FILE from database module
-            c = conn.cursor()
-            c.execute('SELECT SUM(amount) FROM expenses WHERE name=? AND date BETWEEN ? AND ?', (name, first, last))
-            total = c.fetchone()[0] or 0
-            c.execute('SELECT monthly_budget FROM budgets WHERE name=?', (name,))
-            row = c.fetchone()
-            budget = row[0] if row else None
-        if budget is not None and budget > 0:
-            if total > budget:
-                messagebox.showwarning('Budget Exceeded', f"{name} has spent {total:.2f} this month which exceeds budget {budget:.2f}")
-            else:
-                self.status.config(text=f"{name} spent {total:.2f} of {budget:.2f} this month")
+        added = 0
+
+        def step(result):
+            nonlocal added
+            inserted, more = result
+            added += inserted
+            if more:
+                self.status.config(text=f'Adding recurring expenses: {added} so far')
+                self.executor.submit(database.materialize_recurring_batch, today, self.RECURRING_BATCH, on_done=step)
+            elif added:
+                self.refresh_after_write()
+                self.status.config(text=f'Added {added} recurring expense(s)')
+        self.executor.submit(database.materialize_recurring_batch, today, self.RECURRING_BATCH, on_done=step)
+
+    def open_recurring_window(self):
+        win = tk.Toplevel(self.root)
+        win.title('Recurring Expenses')
+        win.geometry('760x420')
+
+        cols = ('id', 'name', 'amount', 'category', 'cadence', 'start', 'end', 'through')
+        rules = ttk.Treeview(win, columns=cols, show='headings', height=8, selectmode='browse')
+        for col, title in zip(cols, ('ID', 'Name', 'Amount', 'Category', 'Every', 'Start', 'End', 'Added Through')):
+            rules.heading(col, text=title)
+            rules.column(col, width=80, anchor='center')
+        rules.pack(fill='both', expand=True, padx=8, pady=8)
+
+        def show(rows):
+            if not win.winfo_exists():
+                return
+            rules.delete(*rules.get_children())
+            for r in rows:
+                every = r[7] if r[8] == 1 else f'{r[8]} x {r[7]}'
+                rules.insert('', 'end', values=(r[0], r[1], f'{r[2]} {r[11]}', r[3], every, r[9], r[10] or '', r[12] or ''))
+
+        def reload():
+            self.executor.submit(database.list_recurring_rules, on_done=show)
+
+        form = ttk.Frame(win, padding=(8, 0))
+        form.pack(fill='x')
+        fields = {}
+        for i, (label, widget) in enumerate((
+                ('Name', ttk.Entry(form, width=14)),
+                ('Amount', ttk.Entry(form, width=10)),
+                ('Category', ttk.Combobox(form, values=['Food','Transport','Entertainment','Other'], state='readonly', width=12)),
+                ('Payment', ttk.Combobox(form, values=['Cash','Card','Online'], state='readonly', width=8)),
+                ('Every', ttk.Combobox(form, values=database.RECURRING_CADENCES, state='readonly', width=8)),
+                ('Interval', ttk.Spinbox(form, from_=1, to=365, width=5)),
+                ('Start', ttk.Entry(form, width=11)),
+                ('End', ttk.Entry(form, width=11)))):
+            ttk.Label(form, text=label).grid(row=0, column=i, sticky='w')
+            widget.grid(row=1, column=i, padx=2)
+            fields[label] = widget
+        fields['Category'].set('Other')
+        fields['Payment'].set('Cash')
+        fields['Every'].set('monthly')
+        fields['Interval'].set(1)
+        fields['Start'].insert(0, date.today().strftime('%Y-%m-%d'))
+
+        def add_rule():
+            name = fields['Name'].get().strip()
+            try:
+                amt = float(fields['Amount'].get())
+                if amt <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror('Validation', 'Amount must be a positive number', parent=win)
+                return
+            if not name:
+                messagebox.showerror('Validation', 'Name required', parent=win)
+                return
+
+            def added(_):
+                # insert the occurrences that are already due, then show the rule
+                self.catch_up_recurring()
+                reload()
+            self.executor.submit(database.add_recurring_rule, name, amt, fields['Category'].get(), fields['Payment'].get(),
+                                 '', '', fields['Every'].get(), fields['Interval'].get(), fields['Start'].get().strip(),
+                                 fields['End'].get().strip() or None,
+                                 on_done=added, on_error=lambda e: messagebox.showerror('Validation', str(e), parent=win))
+
+        def delete_rule():
+            sel = rules.selection()
+            if sel and messagebox.askyesno('Confirm', 'Delete this rule? Expenses it already added are kept.', parent=win):
+                self.executor.submit(database.delete_recurring_rule, rules.item(sel[0])['values'][0], on_done=lambda _: reload())
+
+        buttons = ttk.Frame(win, padding=8)
+        buttons.pack(fill='x')
+        ttk.Button(buttons, text='Add Rule', command=add_rule).pack(side='left', padx=4)
+        ttk.Button(buttons, text='Delete Selected', command=delete_rule).pack(side='left', padx=4)
+        reload()
 
     # --------------------- Theme ---------------------
     def toggle_theme(self):
@@ -354,47 +749,21 @@ class ExpenseTrackerApp:
         except Exception:
             pass
 
-    def show_category_chart(self):
-        # Create a new Toplevel window for the chart
-        chart_win = tk.Toplevel(self.root)
-        chart_win.title("Expense Category Distribution")
-        chart_win.geometry("600x500")
-
-        fig, ax = plt.subplots(figsize=(6, 5))
-        canvas = FigureCanvasTkAgg(fig, master=chart_win)
-        canvas_widget = canvas.get_tk_widget()
-        canvas_widget.pack(side=tk.TOP, fill=tk.BOTH, expand=1)
-
-        self.update_category_chart(ax, canvas)
-
-        # Bind closing event to properly destroy the matplotlib figure
-        chart_win.protocol("WM_DELETE_WINDOW", lambda: self._on_chart_close(chart_win, fig))
-
-    def _on_chart_close(self, chart_win, fig):
-        plt.close(fig) # Close the matplotlib figure to free memory
-        chart_win.destroy()
-
-    def update_category_chart(self, ax, canvas):
-        # Clear previous plot
-        ax.clear()
-
-        # Fetch data
-        with sqlite3.connect(database.DB_FILE) as conn:
-            c = conn.cursor()
-            c.execute("SELECT category, SUM(amount) FROM expenses GROUP BY category")
-            data = c.fetchall()
-
-        if not data:
-            ax.text(0.5, 0.5, "No expense data to display chart.", horizontalalignment='center', verticalalignment='center', transform=ax.transAxes)
-            canvas.draw()
-            return
-
-        categories = [row[0] for row in data]
-        amounts = [row[1] for row in data]
-
-        # Create pie chart
-        ax.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=90)
-        ax.axis('equal') # Equal aspect ratio ensures that pie is drawn as a circle.
-        ax.set_title('Expense Distribution by Category')
-
-        canvas.draw()
\ No newline at end of file
+    def show_charts(self):
+        from charts import ChartWindow
+        if self.chart_window and self.chart_window.is_open:
+            self.chart_window.lift()
+        else:
+            self.chart_window = ChartWindow(self)
+        self.chart_window.refresh()
+
+    def show_diagnostics(self):
+        from diagnostics import DiagnosticsWindow
+        if self.diagnostics_window and self.diagnostics_window.is_open:
+            self.diagnostics_window.lift()
+        else:
+            self.diagnostics_window = DiagnosticsWindow(self)
+
+    def _refresh_chart(self):
+        if self.chart_window and self.chart_window.is_open:
+            self.chart_window.refresh()
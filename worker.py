@@ -0,0 +1,93 @@
+import queue
+import threading
+import itertools
+
+
+class BackgroundExecutor:
+    """Run blocking (database) work on a worker thread and hand results back on the Tk thread.
+
+    Jobs run one at a time in submission order, so a refresh submitted after a
+    write always sees that write. Jobs submitted under the same `key` supersede
+    each other: an older job that has not started yet is skipped, and the result
+    of one that already ran is dropped instead of being delivered.
+    """
+
+    def __init__(self, root, on_busy=None, on_error=None, poll_ms=25):
+        self.root = root
+        self.on_busy = on_busy      # called with the number of outstanding jobs whenever it changes
+        self.on_error = on_error    # fallback for jobs submitted without their own on_error
+        self.poll_ms = poll_ms
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._posted = queue.Queue()    # UI callbacks posted by running jobs
+        self._latest = {}           # key -> ticket of the newest job submitted under it
+        self._tickets = itertools.count(1)
+        self._pending = 0
+        self._polling = False
+        threading.Thread(target=self._run, name='db-worker', daemon=True).start()
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        """Queue fn(*args). on_done(result) / on_error(exc) are called on the Tk thread."""
+        ticket = next(self._tickets)
+        if key is not None:
+            self._latest[key] = ticket
+        self._pending += 1
+        self._jobs.put((ticket, key, fn, args, on_done, on_error))
+        self._notify_busy()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return ticket
+
+    def post(self, fn, *args):
+        """Run fn(*args) on the Tk thread; safe to call from inside a job (e.g. for progress)."""
+        self._posted.put((fn, args))
+
+    def _is_stale(self, ticket, key):
+        return key is not None and self._latest.get(key) != ticket
+
+    def _run(self):
+        while True:
+            ticket, key, fn, args, on_done, on_error = self._jobs.get()
+            if self._is_stale(ticket, key):
+                self._results.put((ticket, key, None, None, None))
+                continue
+            try:
+                self._results.put((ticket, key, fn(*args), None, (on_done, on_error)))
+            except Exception as e:
+                self._results.put((ticket, key, None, e, (on_done, on_error)))
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    fn, args = self._posted.get_nowait()
+                except queue.Empty:
+                    break
+                fn(*args)
+            while True:
+                try:
+                    ticket, key, result, error, callbacks = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending -= 1
+                if callbacks is None or self._is_stale(ticket, key):
+                    continue
+                on_done, on_error = callbacks
+                if error is not None:
+                    handler = on_error or self.on_error
+                    if handler is not None:
+                        handler(error)
+                elif on_done is not None:
+                    on_done(result)
+        finally:
+            # keep polling even if a callback raised, or later results would never arrive
+            self._notify_busy()
+            if self._pending:
+                self.root.after(self.poll_ms, self._poll)
+            else:
+                self._polling = False
+
+    def _notify_busy(self):
+        if self.on_busy is not None:
+            self.on_busy(self._pending)